@@ -0,0 +1,91 @@
+import argparse
+import json
+import ssl
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from http_session import PooledSession
+
+STUB_RESPONSE = json.dumps(
+    {
+        "results": [
+            {"id": 937278, "title": "A Man Called Otto", "release_date": "2022-12-28"}
+        ]
+    }
+).encode("utf-8")
+
+
+class StubTMDBHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep the connection alive
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(STUB_RESPONSE)))
+        self.end_headers()
+        self.wfile.write(STUB_RESPONSE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(cert: str = None, key: str = None):
+    """Start a local stand-in for the TMDB search endpoint, returns (server, url)"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubTMDBHandler)
+    scheme = "http"
+    if cert:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"{scheme}://{host}:{port}/3/search/multi"
+
+
+def run_benchmark(url: str, count: int, verify) -> None:
+    params = {"query": "A Man Called Otto", "page": 1}
+
+    start = time.perf_counter()
+    for _ in range(count):
+        requests.get(url, params=params, verify=verify).raise_for_status()
+    unpooled = time.perf_counter() - start
+
+    session = PooledSession(pool_size=1)
+    start = time.perf_counter()
+    for _ in range(count):
+        session.get(url, params=params, verify=verify).raise_for_status()
+    pooled = time.perf_counter() - start
+
+    print(f"requests.get:  {count} requests in {unpooled:.2f}s")
+    print(f"PooledSession: {count} requests in {pooled:.2f}s")
+    print(f"Speedup: {unpooled / pooled:.1f}x")
+    print(session.stats.summary())
+    session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare per-request connections with the pooled TMDB session"
+    )
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--cert", help="PEM certificate to serve the stub over TLS")
+    parser.add_argument("--key", help="PEM private key for --cert")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.cert, args.key)
+    try:
+        # Self-signed stub certificates can't be verified
+        run_benchmark(url, args.requests, verify=not args.cert)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
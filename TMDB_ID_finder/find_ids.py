@@ -1,26 +1,175 @@
+import argparse
 import csv
+import itertools
+import json
 import os
+import threading
 import time
-from typing import Dict, List, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
 
 import requests
 from dotenv import load_dotenv
 
+from http_session import PooledSession
+from lookup_cache import MISS, LookupCache
+from sinks import RadarrSink, RowSink, SonarrSink, TraktJsonSink, close_all, feed
+from title_index import TitleIndex, best_match
+
 # Load environment variables
 load_dotenv()
 
 
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Thread-safe token bucket shared by every worker talking to TMDB
+
+        Args:
+            rate: Tokens added per second (sustained requests per second)
+            capacity: Maximum burst size, defaults to one second worth of tokens
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def acquire(self) -> None:
+        """Block until a token is available, then consume it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now >= self.paused_until:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    wait = self.paused_until - now
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for the given number of seconds (e.g. after a 429)"""
+        with self.lock:
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + seconds)
+            self.tokens = 0
+            self.updated = self.paused_until
+
+    def update_from_headers(self, headers) -> None:
+        """
+        Adjust the bucket using rate limit headers returned by the API
+
+        TMDB has sent X-RateLimit-Remaining / X-RateLimit-Reset in the past, so
+        honour them when present: never hold more tokens than the server says
+        are left, and wait for the reset once the window is exhausted.
+        """
+        remaining = headers.get("X-RateLimit-Remaining")
+        if remaining is None:
+            return
+        try:
+            remaining = int(remaining)
+        except ValueError:
+            return
+
+        with self.lock:
+            self.tokens = min(self.tokens, remaining)
+
+        if remaining <= 0:
+            reset = headers.get("X-RateLimit-Reset")
+            try:
+                # Reset is an epoch timestamp
+                wait = float(reset) - time.time() if reset else 1.0
+            except ValueError:
+                wait = 1.0
+            self.pause(max(wait, 0.0))
+
+
+def _retry_after_seconds(value: Optional[str], default: float = 1.0) -> float:
+    """Parse a Retry-After header (seconds form) falling back to a default"""
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        return default
+
+
 class TMDBEnricher:
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        rate_limiter: Optional[TokenBucket] = None,
+        max_retries: int = 3,
+        cache: Optional[LookupCache] = None,
+        language: str = "en-US",
+        session: Optional[PooledSession] = None,
+        base_url: str = "https://api.themoviedb.org/3",
+        index: Optional[TitleIndex] = None,
+        min_confidence: float = 0.9,
+    ):
         """
         Initialize TMDB API client
 
         Args:
             api_key: TMDB API key
+            rate_limiter: Token bucket shared by all threads using this client
+            max_retries: How many times to retry a request rejected with 429
+            cache: Persistent lookup cache consulted before calling the API
+            language: TMDB language used for searches and cache keys
+            session: Keep-alive HTTP session, one is created if not given
+            base_url: TMDB API root, overridable to point at a stub server
+            index: Local title index answering confident matches without the API
+            min_confidence: Lowest index score accepted without a remote search
         """
         self.api_key = api_key
-        self.base_url = "https://api.themoviedb.org/3"
+        self.base_url = base_url
         self.headers = {"accept": "application/json"}
+        self.rate_limiter = rate_limiter or TokenBucket(rate=4.0)
+        self.max_retries = max_retries
+        self.cache = cache
+        self.language = language
+        self.session = session or PooledSession()
+        self.index = index
+        self.min_confidence = min_confidence
+        self.index_hits = 0
+        self.lock = threading.Lock()
+
+    def search_index(self, title: str, content_type: str = None) -> Optional[Dict]:
+        """
+        Answer a search from the local title index
+
+        Returns:
+            The best indexed title if it scores at least min_confidence and is
+            not tied with a different title, None otherwise. Near misses only
+            count when their numbers, roman numerals and year match, so a
+            sequel is searched for instead of mapped to its predecessor.
+        """
+        if self.index is None:
+            return None
+
+        candidates = self.index.lookup(
+            title, content_type, limit=2, min_score=self.min_confidence, strict=True
+        )
+        if not candidates or candidates[0][0] < self.min_confidence:
+            return None
+        if len(candidates) > 1 and candidates[1][0] == candidates[0][0]:
+            # e.g. two different shows with the same name and no year hint
+            if candidates[1][1]["id"] != candidates[0][1]["id"]:
+                return None
+
+        with self.lock:
+            self.index_hits += 1
+        return candidates[0][1]
 
     def search_title(self, title: str, content_type: str = None) -> Optional[Dict]:
         """
@@ -33,6 +182,15 @@ class TMDBEnricher:
         Returns:
             Dict containing title information if found, None otherwise
         """
+        local = self.search_index(title, content_type)
+        if local is not None:
+            return local
+
+        if self.cache is not None:
+            cached = self.cache.get(title, content_type, self.language)
+            if cached is not MISS:
+                return cached
+
         # If content type is known, search specific endpoint
         if content_type == "movie":
             endpoint = f"{self.base_url}/search/movie"
@@ -45,157 +203,358 @@ class TMDBEnricher:
         params = {
             "api_key": self.api_key,
             "query": title,
-            "language": "en-US",
+            "language": self.language,
             "page": 1,
         }
 
-        response = requests.get(endpoint, headers=self.headers, params=params)
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            response = self.session.get(
+                endpoint, headers=self.headers, params=params
+            )
+            self.rate_limiter.update_from_headers(response.headers)
+
+            if response.status_code != 429 or attempt == self.max_retries:
+                break
+
+            # Too many requests: stall every worker for as long as TMDB asks
+            wait = _retry_after_seconds(response.headers.get("Retry-After"))
+            print(f"Rate limited by TMDB, retrying {title} in {wait:.1f}s")
+            self.rate_limiter.pause(wait)
+
         response.raise_for_status()
 
         results = response.json().get("results", [])
-        return results[0] if results else None
+        # /search/multi also returns people
+        results = [r for r in results if r.get("media_type") != "person"]
+        result = best_match(title, results)
 
+        if result is not None and self.index is not None:
+            self.index.add_result(result)
 
-def process_csv(
-    input_path: str, output_path: str, tmdb_api_key: str, content_type_col: str = None
-) -> None:
+        if self.cache is not None:
+            self.cache.set(title, content_type, self.language, result)
+
+        return result
+
+
+def enrich_row(
+    enricher: TMDBEnricher, row: Dict, content_type_col: str = None
+) -> Optional[Dict]:
     """
-    Process CSV file and add TMDB IDs
+    Look up a single input row on TMDB and add the tmdb columns to it
 
     Args:
-        input_path: Path to input CSV file
-        output_path: Path for output CSV file
-        tmdb_api_key: TMDB API key
+        enricher: TMDB client to search with
+        row: Input CSV row, must contain a 'title' column
         content_type_col: Name of column containing content type (movie/tv) if exists
+
+    Returns:
+        The enriched row, or None if the lookup failed
     """
-    enricher = TMDBEnricher(tmdb_api_key)
+    title = row["title"]  # Assumes 'title' column exists
+    content_type = row.get(content_type_col) if content_type_col else None
+
+    print(f"Processing: {title}")
+
+    try:
+        # Search TMDB
+        result = enricher.search_title(title, content_type)
+
+        if result:
+            # Extract year from release_date or first_air_date
+            year = None
+            if "release_date" in result:
+                year = result["release_date"][:4]
+            elif "first_air_date" in result:
+                year = result["first_air_date"][:4]
+
+            # Update row with TMDB info
+            row.update(
+                {
+                    "tmdb_id": result["id"],
+                    "type": "movie" if "release_date" in result else "tv",
+                    "year": year,
+                    "match_title": result.get("title") or result.get("name"),
+                }
+            )
+        else:
+            # If no match found, add empty values
+            row.update({"tmdb_id": "", "type": "", "year": "", "match_title": ""})
 
-    # Read input CSV
-    with open(input_path, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        rows = list(reader)
+        return row
 
-        # Get fieldnames and add new columns
-        fieldnames = reader.fieldnames + ["tmdb_id", "type", "year", "match_title"]
+    except requests.exceptions.RequestException as e:
+        print(f"Error processing {title}: {str(e)}")
+        return None
+    except Exception as e:
+        print(f"Unexpected error processing {title}: {str(e)}")
+        return None
 
-        # Process each row
-        enriched_rows = []
+
+def ordered_map(
+    func: Callable[[Dict], Optional[Dict]], rows: Iterable[Dict], max_workers: int
+) -> Iterator[Optional[Dict]]:
+    """
+    Apply func to rows on a thread pool, yielding results in input order
+
+    At most max_workers * 2 rows are in flight at once, so the input can be a
+    lazy iterator without the whole file being submitted up front.
+    """
+    if max_workers <= 1:
         for row in rows:
-            title = row["title"]  # Assumes 'title' column exists
-            content_type = row.get(content_type_col) if content_type_col else None
+            yield func(row)
+        return
 
-            print(f"Processing: {title}")
+    window = max_workers * 2
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for row in rows:
+            pending.append(executor.submit(func, row))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
 
-            try:
-                # Search TMDB
-                result = enricher.search_title(title, content_type)
-
-                if result:
-                    # Extract year from release_date or first_air_date
-                    year = None
-                    if "release_date" in result:
-                        year = result["release_date"][:4]
-                    elif "first_air_date" in result:
-                        year = result["first_air_date"][:4]
-
-                    # Update row with TMDB info
-                    row.update(
-                        {
-                            "tmdb_id": result["id"],
-                            "type": "movie" if "release_date" in result else "tv",
-                            "year": year,
-                            "match_title": result.get("title") or result.get("name"),
-                        }
-                    )
-                else:
-                    # If no match found, add empty values
-                    row.update(
-                        {"tmdb_id": "", "type": "", "year": "", "match_title": ""}
-                    )
 
-                enriched_rows.append(row)
+def load_checkpoint(checkpoint_path: str) -> Dict:
+    """
+    Read a process_csv checkpoint
 
-                # Sleep briefly to avoid rate limiting
-                time.sleep(0.25)  # 4 requests per second should be safe
+    Returns:
+        Dict with the number of input rows already handled ('rows') and the
+        output file size in bytes when that was recorded ('output_bytes')
+    """
+    if not os.path.exists(checkpoint_path):
+        return {"rows": 0, "output_bytes": 0}
+    with open(checkpoint_path, "r", encoding="utf-8") as f:
+        return json.load(f)
 
-            except requests.exceptions.RequestException as e:
-                print(f"Error processing {title}: {str(e)}")
-                continue
-            except Exception as e:
-                print(f"Unexpected error processing {title}: {str(e)}")
-                continue
 
-    # Write output CSV
-    with open(output_path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(enriched_rows)
+def save_checkpoint(checkpoint_path: str, rows: int, output_bytes: int) -> None:
+    """Atomically record progress so an interrupted run can be resumed"""
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"rows": rows, "output_bytes": output_bytes}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, checkpoint_path)
 
-    print(f"\nProcessing complete. Results written to {output_path}")
-    print(f"Total processed: {len(enriched_rows)}")
+
+def process_csv(
+    input_path: str,
+    output_path: str,
+    tmdb_api_key: str,
+    content_type_col: str = None,
+    max_workers: int = 1,
+    requests_per_second: float = 4.0,
+    cache_path: Optional[str] = "tmdb_cache.sqlite",
+    batch_size: int = 100,
+    resume: bool = False,
+    index_exports: Optional[Dict[str, str]] = None,
+    min_confidence: float = 0.9,
+    sinks: Optional[List[RowSink]] = None,
+) -> None:
+    """
+    Process CSV file and add TMDB IDs
+
+    Rows are streamed from the input and appended to the output in batches,
+    so memory use does not grow with the size of the file. After each batch
+    the output is fsynced and a checkpoint is written next to it; with
+    resume=True rows covered by the checkpoint are skipped.
+
+    Args:
+        input_path: Path to input CSV file
+        output_path: Path for output CSV file
+        tmdb_api_key: TMDB API key
+        content_type_col: Name of column containing content type (movie/tv) if exists
+        max_workers: Number of TMDB requests allowed in flight at once
+        requests_per_second: Sustained request rate shared by all workers
+        cache_path: SQLite file caching previous lookups, None disables caching
+        batch_size: Number of input rows between fsync/checkpoint
+        resume: Continue from the checkpoint of a previous interrupted run
+        index_exports: TMDB daily export files to index, keyed by 'movie'/'tv'
+        min_confidence: Lowest local index score accepted without searching TMDB
+        sinks: Extra destinations (e.g. Sonarr/Radarr lists) fed each enriched row
+    """
+    sinks = sinks or []
+    rate_limiter = TokenBucket(rate=requests_per_second)
+    cache = LookupCache(cache_path) if cache_path else None
+    session = PooledSession(pool_size=max(max_workers, 1))
+
+    try:
+        # Titles resolved by the previous run (the output about to be replaced)
+        # and any daily exports can be matched locally without calling TMDB
+        index = TitleIndex()
+        if os.path.exists(output_path):
+            index.load_enriched_csv(output_path)
+        for content_type, export_path in (index_exports or {}).items():
+            index.load_daily_export(export_path, content_type)
+        print(f"Local title index holds {len(index)} titles")
+
+        enricher = TMDBEnricher(
+            tmdb_api_key,
+            rate_limiter=rate_limiter,
+            cache=cache,
+            session=session,
+            index=index,
+            min_confidence=min_confidence,
+        )
+
+        checkpoint_path = output_path + ".checkpoint"
+        checkpoint = {"rows": 0, "output_bytes": 0}
+        if resume and os.path.exists(output_path):
+            checkpoint = load_checkpoint(checkpoint_path)
+            if checkpoint["rows"]:
+                print(f"Resuming after {checkpoint['rows']} already processed rows")
+
+        total_written = 0
+        with open(input_path, "r", encoding="utf-8") as f_in:
+            reader = csv.DictReader(f_in)
+
+            # Get fieldnames and add new columns
+            fieldnames = reader.fieldnames + ["tmdb_id", "type", "year", "match_title"]
+
+            # Skip rows a previous run already handled
+            rows = itertools.islice(reader, checkpoint["rows"], None)
+
+            with open(output_path, "a+", newline="", encoding="utf-8") as f_out:
+                # Drop anything written after the last checkpoint, it may be partial
+                f_out.truncate(checkpoint["output_bytes"])
+                f_out.seek(checkpoint["output_bytes"])
+
+                writer = csv.DictWriter(f_out, fieldnames=fieldnames)
+                if checkpoint["output_bytes"] == 0:
+                    writer.writeheader()
+                elif sinks:
+                    # Sinks are rewritten from scratch, replay the rows kept from
+                    # the interrupted run before adding new ones
+                    with open(output_path, "r", encoding="utf-8") as f_done:
+                        feed(sinks, csv.DictReader(f_done))
+
+                processed = checkpoint["rows"]
+
+                def commit() -> None:
+                    f_out.flush()
+                    os.fsync(f_out.fileno())
+                    save_checkpoint(checkpoint_path, processed, f_out.tell())
+                    # Cached lookups are committed with the rows they produced
+                    if cache is not None:
+                        cache.flush()
+
+                # Process each row, throughput is bounded by the shared rate limiter
+                for row in ordered_map(
+                    lambda row: enrich_row(enricher, row, content_type_col),
+                    rows,
+                    max_workers,
+                ):
+                    processed += 1
+                    if row is not None:
+                        writer.writerow(row)
+                        feed(sinks, [row])
+                        total_written += 1
+                    if processed % batch_size == 0:
+                        commit()
+
+                commit()
+
+        close_all(sinks)
+
+        # The run finished, nothing left to resume
+        os.remove(checkpoint_path)
+
+        print(f"\nProcessing complete. Results written to {output_path}")
+        print(f"Total processed: {total_written}")
+        print(f"Matched locally: {enricher.index_hits}")
+    finally:
+        print(session.stats.summary())
+        session.close()
+        if cache is not None:
+            print(cache.stats())
+            cache.close()
 
 
 def split_into_sonarr_radarr(
     input_path: str, sonarr_output: str, radarr_output: str
 ) -> None:
     """
-    Split enriched CSV into separate files for Sonarr and Radarr
+    Split an existing enriched CSV into separate files for Sonarr and Radarr
+
+    process_csv can write these directly through sinks; this is for enriched
+    files produced earlier.
 
     Args:
         input_path: Path to enriched CSV file
         sonarr_output: Path for Sonarr CSV output
         radarr_output: Path for Radarr CSV output
     """
-    tv_shows = []
-    movies = []
+    sonarr = SonarrSink(sonarr_output)
+    radarr = RadarrSink(radarr_output)
 
     # Read enriched CSV
     with open(input_path, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-
-        for row in reader:
-            if row["type"] == "tv":
-                tv_shows.append(
-                    {
-                        "title": row["match_title"],
-                        "tmdb_id": row["tmdb_id"],
-                        "year": row["year"],
-                    }
-                )
-            elif row["type"] == "movie":
-                movies.append(
-                    {
-                        "title": row["match_title"],
-                        "tmdb_id": row["tmdb_id"],
-                        "year": row["year"],
-                    }
-                )
-
-    # Write Sonarr CSV
-    if tv_shows:
-        with open(sonarr_output, "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=["title", "tmdb_id", "year"])
-            writer.writeheader()
-            writer.writerows(tv_shows)
-
-    # Write Radarr CSV
-    if movies:
-        with open(radarr_output, "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=["title", "tmdb_id", "year"])
-            writer.writeheader()
-            writer.writerows(movies)
-
-    print(f"\nFound {len(tv_shows)} TV shows and {len(movies)} movies")
-    print(f"TV shows written to: {sonarr_output}")
-    print(f"Movies written to: {radarr_output}")
+        feed([sonarr, radarr], csv.DictReader(f))
+    close_all([sonarr, radarr])
+
+    print_split_summary(sonarr, radarr)
+
+
+def print_split_summary(sonarr: SonarrSink, radarr: RadarrSink) -> None:
+    print(f"\nFound {sonarr.count} TV shows and {radarr.count} movies")
+    print(f"TV shows written to: {sonarr.path}")
+    print(f"Movies written to: {radarr.path}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Add TMDB IDs to a CSV of titles")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of TMDB requests to keep in flight (default: 4)",
+    )
+    parser.add_argument(
+        "--rps",
+        type=float,
+        default=4.0,
+        help="Maximum TMDB requests per second across all workers (default: 4)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always query TMDB instead of using the local lookup cache",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip rows already written by a previous interrupted run",
+    )
+    parser.add_argument(
+        "--movie-export",
+        help="TMDB daily movie ID export (movie_ids_MM_DD_YYYY.json.gz) to match against",
+    )
+    parser.add_argument(
+        "--tv-export",
+        help="TMDB daily TV ID export (tv_series_ids_MM_DD_YYYY.json.gz) to match against",
+    )
+    parser.add_argument(
+        "--min-confidence",
+        type=float,
+        default=0.9,
+        help="Lowest local match score accepted without searching TMDB (default: 0.9)",
+    )
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
+    args = parse_args()
+
     # Configuration
     INPUT_CSV = "titles.csv"  # Your input CSV with titles
     ENRICHED_CSV = "enriched_titles.csv"  # Intermediate file with TMDB data
     SONARR_CSV = "sonarr_import.csv"  # Final Sonarr import file
     RADARR_CSV = "radarr_import.csv"  # Final Radarr import file
+    TRAKT_JSON = "trakt_collection.json"  # /sync/collection payload for Trakt
     # Get API key from environment variable
     TMDB_API_KEY = os.getenv("TMDB_API_KEY")
     if not TMDB_API_KEY:
@@ -203,8 +562,31 @@ if __name__ == "__main__":
             "TMDB_API_KEY not found in environment variables. Please check your .env file."
         )
 
-    # Process CSV and add TMDB IDs
-    process_csv(INPUT_CSV, ENRICHED_CSV, TMDB_API_KEY)
+    # Sonarr, Radarr and Trakt outputs are written as rows are enriched
+    sonarr = SonarrSink(SONARR_CSV)
+    radarr = RadarrSink(RADARR_CSV)
+    trakt = TraktJsonSink(TRAKT_JSON)
 
-    # Split into separate files for Sonarr and Radarr
-    split_into_sonarr_radarr(ENRICHED_CSV, SONARR_CSV, RADARR_CSV)
+    # Process CSV and add TMDB IDs
+    process_csv(
+        INPUT_CSV,
+        ENRICHED_CSV,
+        TMDB_API_KEY,
+        max_workers=args.workers,
+        requests_per_second=args.rps,
+        cache_path=None if args.no_cache else "tmdb_cache.sqlite",
+        resume=args.resume,
+        index_exports={
+            content_type: path
+            for content_type, path in (
+                ("movie", args.movie_export),
+                ("tv", args.tv_export),
+            )
+            if path
+        },
+        min_confidence=args.min_confidence,
+        sinks=[sonarr, radarr, trakt],
+    )
+
+    print_split_summary(sonarr, radarr)
+    print(f"Trakt collection payload written to: {TRAKT_JSON}")
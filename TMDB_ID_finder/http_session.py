@@ -0,0 +1,172 @@
+import threading
+import time
+from typing import Dict, List
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+# Connect timings of the most recent connection opened on this thread, and
+# the time to first byte of its most recent response. A request and the
+# connection it uses always run on the same thread.
+_local = threading.local()
+
+
+class TimedHTTPConnection(HTTPConnection):
+    def _new_conn(self):
+        start = time.perf_counter()
+        sock = super()._new_conn()
+        _local.connect = time.perf_counter() - start
+        _local.tls = 0.0
+        return sock
+
+    def getresponse(self, *args, **kwargs):
+        # Called once the request is sent, returns when the headers are read
+        start = time.perf_counter()
+        response = super().getresponse(*args, **kwargs)
+        _local.ttfb = time.perf_counter() - start
+        return response
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def _new_conn(self):
+        start = time.perf_counter()
+        sock = super()._new_conn()
+        _local.connect = time.perf_counter() - start
+        return sock
+
+    def connect(self):
+        start = time.perf_counter()
+        _local.connect = 0.0
+        super().connect()
+        # connect() is TCP connect followed by the TLS handshake
+        _local.tls = max(time.perf_counter() - start - _local.connect, 0.0)
+
+    def getresponse(self, *args, **kwargs):
+        # Called once the request is sent, returns when the headers are read
+        start = time.perf_counter()
+        response = super().getresponse(*args, **kwargs)
+        _local.ttfb = time.perf_counter() - start
+        return response
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools record how long connection setup takes"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+class RequestStats:
+    def __init__(self):
+        """
+        Collects per-request timings (seconds) for a session
+
+        ttfb runs from the request being sent until its response headers
+        were read, on the attempt that got the response. total also covers
+        connection setup, urllib3 retries and reading the body.
+        """
+        self.lock = threading.Lock()
+        self.timings: Dict[str, List[float]] = {
+            "connect": [],
+            "tls": [],
+            "ttfb": [],
+            "total": [],
+        }
+        self.new_connections = 0
+
+    def record(self, connect: float, tls: float, ttfb: float, total: float) -> None:
+        with self.lock:
+            self.timings["connect"].append(connect)
+            self.timings["tls"].append(tls)
+            self.timings["ttfb"].append(ttfb)
+            self.timings["total"].append(total)
+            if connect or tls:
+                self.new_connections += 1
+
+    def summary(self) -> str:
+        with self.lock:
+            count = len(self.timings["total"])
+            if not count:
+                return "No requests made"
+            averages = ", ".join(
+                f"{name} {sum(values) / count * 1000:.1f}ms"
+                for name, values in self.timings.items()
+            )
+            return (
+                f"Requests: {count}, new connections: {self.new_connections}, "
+                f"avg {averages}"
+            )
+
+
+class PooledSession:
+    def __init__(
+        self,
+        pool_size: int = 10,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        timeout: float = 10.0,
+    ):
+        """
+        Keep-alive HTTP session with retries and timing stats
+
+        Args:
+            pool_size: Connections kept open per host, should cover the worker count
+            max_retries: Retries for 5xx responses and dropped connections
+            backoff_factor: Exponential backoff base between retries (seconds)
+            timeout: Connect/read timeout for each request (seconds)
+        """
+        self.timeout = timeout
+        self.stats = RequestStats()
+        self.session = requests.Session()
+
+        # 429 is left to the caller so it can pause the shared rate limiter
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False,
+        )
+        adapter = TimedHTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """GET a URL through the pool, recording its timings"""
+        kwargs.setdefault("timeout", self.timeout)
+        _local.connect = 0.0
+        _local.tls = 0.0
+        _local.ttfb = 0.0
+        start = time.perf_counter()
+        response = self.session.get(url, **kwargs)
+        total = time.perf_counter() - start
+        self.stats.record(
+            connect=_local.connect,
+            tls=_local.tls,
+            ttfb=_local.ttfb,
+            total=total,
+        )
+        return response
+
+    def close(self) -> None:
+        self.session.close()
@@ -0,0 +1,149 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, Optional, Tuple
+
+# Sentinel returned by LookupCache.get when nothing usable is cached
+MISS = object()
+
+
+def normalize_title(title: str) -> str:
+    """
+    Normalize a title for cache keys and index lookups
+
+    Lowercases, strips accents and punctuation, and collapses whitespace so
+    that "Amélie" and "amelie " map to the same entry.
+    """
+    title = unicodedata.normalize("NFKD", title)
+    title = "".join(c for c in title if not unicodedata.combining(c))
+    title = re.sub(r"[^\w\s]", " ", title.lower())
+    return " ".join(title.split())
+
+
+class LookupCache:
+    def __init__(
+        self,
+        path: str = "tmdb_cache.sqlite",
+        ttl: float = 30 * 24 * 3600,
+        negative_ttl: float = 7 * 24 * 3600,
+        max_entries: int = 200_000,
+    ):
+        """
+        Persistent SQLite cache for TMDB search results
+
+        Args:
+            path: SQLite database file
+            ttl: Seconds a found result stays valid
+            negative_ttl: Seconds a "no match" result stays valid
+            max_entries: Oldest accessed entries are evicted beyond this size
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS lookups (
+                title TEXT NOT NULL,
+                content_type TEXT NOT NULL,
+                language TEXT NOT NULL,
+                result TEXT,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL,
+                PRIMARY KEY (title, content_type, language)
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS lookups_accessed ON lookups (accessed)"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def _key(title: str, content_type: Optional[str], language: str) -> Tuple:
+        return (normalize_title(title), content_type or "", language)
+
+    def get(self, title: str, content_type: Optional[str], language: str):
+        """
+        Return the cached result, None for a cached "no match", or MISS
+        """
+        key = self._key(title, content_type, language)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT result, created FROM lookups"
+                " WHERE title = ? AND content_type = ? AND language = ?",
+                key,
+            ).fetchone()
+
+            if row is not None:
+                result, created = row
+                ttl = self.ttl if result is not None else self.negative_ttl
+                if now - created <= ttl:
+                    self.conn.execute(
+                        "UPDATE lookups SET accessed = ?"
+                        " WHERE title = ? AND content_type = ? AND language = ?",
+                        (now,) + key,
+                    )
+                    self.hits += 1
+                    return json.loads(result) if result is not None else None
+
+            self.misses += 1
+            return MISS
+
+    def set(
+        self,
+        title: str,
+        content_type: Optional[str],
+        language: str,
+        result: Optional[Dict],
+    ) -> None:
+        """
+        Store a result, None records that TMDB had no match
+
+        Writes become durable on the next flush.
+        """
+        key = self._key(title, content_type, language)
+        now = time.time()
+        payload = json.dumps(result) if result is not None else None
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO lookups"
+                " (title, content_type, language, result, created, accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                key + (payload, now, now),
+            )
+
+    def flush(self) -> None:
+        """Evict beyond max_entries and commit pending writes"""
+        with self.lock:
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self) -> None:
+        count = self.conn.execute("SELECT COUNT(*) FROM lookups").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM lookups WHERE rowid IN"
+                " (SELECT rowid FROM lookups ORDER BY accessed LIMIT ?)",
+                (excess,),
+            )
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0.0
+        return f"Cache hits: {self.hits}, misses: {self.misses} ({rate:.1f}% hit rate)"
+
+    def close(self) -> None:
+        with self.lock:
+            self._evict()
+            self.conn.commit()
+            self.conn.close()
@@ -0,0 +1,120 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+from typing import Dict, Iterable, List
+
+
+class RowSink:
+    """
+    Destination for enriched rows
+
+    process_csv calls write() once per enriched row as soon as it is
+    available and close() after the last one, so sinks never need the
+    enriched CSV to be read back.
+    """
+
+    def write(self, row: Dict) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class ImportCsvSink(RowSink):
+    def __init__(self, path: str, content_type: str):
+        """
+        Write rows of one content type as a Sonarr/Radarr import list
+
+        Args:
+            path: Output CSV path, only created once a matching row arrives
+            content_type: 'tv' for Sonarr or 'movie' for Radarr
+        """
+        self.path = path
+        self.content_type = content_type
+        self.count = 0
+        self.file = None
+        self.writer = None
+
+    def write(self, row: Dict) -> None:
+        if row.get("type") != self.content_type:
+            return
+        if self.file is None:
+            self.file = open(self.path, "w", newline="", encoding="utf-8")
+            self.writer = csv.DictWriter(self.file, fieldnames=["title", "tmdb_id", "year"])
+            self.writer.writeheader()
+        self.writer.writerow(
+            {"title": row["match_title"], "tmdb_id": row["tmdb_id"], "year": row["year"]}
+        )
+        self.count += 1
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+
+
+class SonarrSink(ImportCsvSink):
+    def __init__(self, path: str):
+        super().__init__(path, "tv")
+
+
+class RadarrSink(ImportCsvSink):
+    def __init__(self, path: str):
+        super().__init__(path, "movie")
+
+
+class TraktJsonSink(RowSink):
+    def __init__(self, path: str):
+        """
+        Write a /sync/collection payload: {"movies": [...], "shows": [...]}
+
+        Each section is streamed to its own temporary file and the two are
+        joined on close, so memory stays constant.
+        """
+        self.path = path
+        self.counts = {"movies": 0, "shows": 0}
+        directory = os.path.dirname(os.path.abspath(path))
+        self.parts = {
+            section: tempfile.TemporaryFile("w+", encoding="utf-8", dir=directory)
+            for section in self.counts
+        }
+
+    def write(self, row: Dict) -> None:
+        if row.get("type") == "movie":
+            section = "movies"
+        elif row.get("type") == "tv":
+            section = "shows"
+        else:
+            return
+        part = self.parts[section]
+        if self.counts[section]:
+            part.write(",\n")
+        item = {"title": row["match_title"], "ids": {"tmdb": int(row["tmdb_id"])}}
+        if row.get("year"):
+            item["year"] = int(row["year"])
+        part.write("    " + json.dumps(item, ensure_ascii=False))
+        self.counts[section] += 1
+
+    def close(self) -> None:
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("{\n")
+            for i, (section, part) in enumerate(self.parts.items()):
+                f.write(f'  "{section}": [\n')
+                part.seek(0)
+                shutil.copyfileobj(part, f)
+                part.close()
+                f.write("\n  ]" + ("," if i < len(self.parts) - 1 else "") + "\n")
+            f.write("}\n")
+
+
+def feed(sinks: List[RowSink], rows: Iterable[Dict]) -> None:
+    """Write every row to every sink"""
+    for row in rows:
+        for sink in sinks:
+            sink.write(row)
+
+
+def close_all(sinks: List[RowSink]) -> None:
+    for sink in sinks:
+        sink.close()
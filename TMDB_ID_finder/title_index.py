@@ -0,0 +1,339 @@
+import csv
+import gzip
+import json
+import math
+import re
+import threading
+from array import array
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from lookup_cache import normalize_title
+
+YEAR_PATTERN = re.compile(r"[\(\[]((?:19|20)\d{2})[\)\]]\s*$")
+ROMAN_PATTERN = re.compile(r"^m{0,3}(cm|cd|d?c{0,3})(xc|xl|l?x{0,3})(ix|iv|v?i{0,3})$")
+
+
+def split_year(title: str) -> Tuple[str, Optional[str]]:
+    """
+    Split a trailing bracketed year hint off a title
+
+    "Dune (2021)" -> ("Dune", "2021"), "Blade Runner 2049" is left alone
+    """
+    match = YEAR_PATTERN.search(title)
+    if match and match.start() > 0:
+        return title[: match.start()].strip(), match.group(1)
+    return title, None
+
+
+def number_tokens(normalized: str) -> Tuple[str, ...]:
+    """
+    Digits and roman numerals of a normalized title, in order
+
+    These tell sequels and parts apart ("part 1" / "part 2", "episode v" /
+    "episode vi") although the titles are nearly identical.
+    """
+    return tuple(
+        token
+        for token in normalized.split()
+        if token.isdigit() or ROMAN_PATTERN.match(token)
+    )
+
+
+def trigrams(normalized: str) -> set:
+    """Character trigrams of a normalized title, padded so short titles still match"""
+    padded = f"  {normalized} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    # Posting lists longer than this are only walked when a match could be missed otherwise
+    MAX_POSTINGS = 2000
+    # Most posting entries one fuzzy lookup may walk
+    MAX_WORK = 10000
+
+    def __init__(self):
+        """
+        In-memory trigram index of titles already known to map to a TMDB ID
+
+        Entries are stored column-wise; the inverted index maps each trigram
+        to the positions of the titles containing it.
+        """
+        self.ids = array("q")
+        self.years: List[str] = []
+        self.types: List[str] = []
+        self.titles: List[str] = []
+        self.normalized: List[str] = []
+        self.sizes = array("H")
+        self.postings: Dict[str, array] = defaultdict(lambda: array("I"))
+        self.exact: Dict[str, List[int]] = defaultdict(list)
+        self.known = set()
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(
+        self,
+        tmdb_id: int,
+        title: str,
+        content_type: str,
+        year: str = "",
+        alias: Optional[str] = None,
+    ) -> None:
+        """
+        Add one title, duplicates of (id, type, title) are ignored
+
+        Args:
+            alias: Alternative spelling to index, lookups matching it still
+                return the canonical title
+        """
+        normalized = normalize_title(alias or title)
+        key = (int(tmdb_id), content_type, normalized)
+        with self.lock:
+            if not normalized or key in self.known:
+                return
+            self.known.add(key)
+            self._append(int(tmdb_id), title, normalized, content_type, year)
+
+    def _append(
+        self, tmdb_id: int, title: str, normalized: str, content_type: str, year: str
+    ) -> None:
+        position = len(self.ids)
+        grams = trigrams(normalized)
+        self.ids.append(tmdb_id)
+        self.years.append(year or "")
+        self.types.append(content_type)
+        self.titles.append(title)
+        self.normalized.append(normalized)
+        self.sizes.append(min(len(grams), 65535))
+        self.exact[normalized].append(position)
+        for gram in grams:
+            self.postings[gram].append(position)
+
+    def add_result(self, result: Dict) -> None:
+        """Add a result as returned by the TMDB search endpoints"""
+        if "release_date" in result or result.get("media_type") == "movie":
+            content_type = "movie"
+            date = result.get("release_date") or ""
+        else:
+            content_type = "tv"
+            date = result.get("first_air_date") or ""
+        title = result.get("title") or result.get("name")
+        if title:
+            self.add(result["id"], title, content_type, date[:4])
+
+    def load_enriched_csv(self, path: str) -> int:
+        """Load titles resolved by a previous process_csv run, returns rows added"""
+        before = len(self)
+        with open(path, "r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                if not row.get("tmdb_id") or not row.get("type"):
+                    continue
+                # Index both TMDB's canonical title and the input spelling
+                canonical = row.get("match_title") or row.get("title")
+                for alias in (row.get("match_title"), row.get("title")):
+                    if alias:
+                        self.add(
+                            row["tmdb_id"],
+                            canonical,
+                            row["type"],
+                            row.get("year"),
+                            alias=alias,
+                        )
+        return len(self) - before
+
+    def load_daily_export(self, path: str, content_type: str) -> int:
+        """
+        Load a TMDB daily ID export (gzipped JSON lines)
+
+        Args:
+            path: e.g. movie_ids_10_18_2026.json.gz or tv_series_ids_....json.gz
+            content_type: 'movie' or 'tv'
+        """
+        before = len(self)
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry.get("adult"):
+                    continue
+                title = entry.get("original_title") or entry.get("original_name")
+                if title:
+                    self.add(entry["id"], title, content_type)
+        return len(self) - before
+
+    def lookup(
+        self,
+        title: str,
+        content_type: Optional[str] = None,
+        year: Optional[str] = None,
+        limit: int = 5,
+        min_score: float = 0.0,
+        strict: bool = False,
+    ) -> List[Tuple[float, Dict]]:
+        """
+        Rank indexed titles against a query
+
+        Scores are the Dice coefficient of the trigram sets (1.0 for an exact
+        title), plus 0.1 when the year hint agrees and minus 0.1 when it is
+        off by more than a year.
+
+        Args:
+            min_score: Titles scoring below this may be left out. Raising it
+                lets the search skip the query's most common trigrams.
+            strict: Leave out titles whose year differs from a given year, and
+                non-exact titles whose numbers and roman numerals differ from
+                the query's or whose year is unknown when one is given
+
+        Returns:
+            Up to limit (score, entry) tuples, best first
+        """
+        if year is None:
+            title, year = split_year(title)
+        normalized = normalize_title(title)
+        if not normalized:
+            return []
+
+        # Entries are appended whole under the lock, so every position below
+        # this size is complete and ranking can run without holding it
+        with self.lock:
+            size = len(self.ids)
+        return self._rank(normalized, content_type, year, limit, min_score, strict, size)
+
+    def _candidates(self, query: set, min_score: float, size: int) -> Dict[int, int]:
+        """
+        Positions sharing trigrams with the query, with the overlap count
+
+        A title with Dice score d shares at least d * |q| / (2 - d) query
+        trigrams, so it must turn up in the |q| - that + 1 rarest posting
+        lists. Those are always walked, unless together they exceed
+        MAX_WORK entries, in which case the query is too common to match
+        locally and is left to the remote search. Other lists are walked
+        only when shorter than MAX_POSTINGS; the very common trigrams ("the",
+        " a ") are counted afterwards, and only for candidates that could
+        still reach d.
+        """
+        lengths = {gram: len(self.postings.get(gram, ())) for gram in query}
+        grams = sorted(query, key=lengths.get)
+        # The year bonus can lift a title by 0.1
+        dice = max(min_score - 0.1, 0.0)
+        needed = math.ceil(dice * len(query) / (2 - dice)) if dice else 1
+        prefix = grams[: len(grams) - needed + 1]
+        if sum(lengths[gram] for gram in prefix) > self.MAX_WORK:
+            return {}
+        skipped = {
+            gram for gram in grams[len(prefix) :] if lengths[gram] > self.MAX_POSTINGS
+        }
+
+        overlaps = Counter()
+        for gram in grams:
+            if lengths[gram] and gram not in skipped:
+                overlaps.update(self.postings[gram])
+
+        # Titles too short or too long to reach dice
+        low = len(query) * dice / (2 - dice)
+        high = len(query) * (2 - dice) / dice if dice else float("inf")
+        candidates = {}
+        for position, overlap in overlaps.items():
+            if position >= size or not low <= self.sizes[position] <= high:
+                continue
+            if overlap + len(skipped) < needed:
+                continue
+            if skipped:
+                overlap += len(skipped & trigrams(self.normalized[position]))
+            candidates[position] = overlap
+        return candidates
+
+    def _rank(
+        self,
+        normalized: str,
+        content_type: Optional[str],
+        year: Optional[str],
+        limit: int,
+        min_score: float,
+        strict: bool,
+        size: int,
+    ) -> List[Tuple[float, Dict]]:
+        query = trigrams(normalized)
+        exact = [
+            position
+            for position in self.exact.get(normalized, ())
+            if position < size and (not content_type or self.types[position] == content_type)
+        ]
+        if exact:
+            overlaps = Counter({position: len(query) for position in exact})
+        else:
+            overlaps = self._candidates(query, min_score, size)
+        numbers = number_tokens(normalized)
+
+        scored = []
+        for position, overlap in overlaps.items():
+            if content_type and self.types[position] != content_type:
+                continue
+            if strict:
+                # The same title from another year is a remake, and a near
+                # miss on a sequel or of unknown year a different title
+                if year and self.years[position] and self.years[position] != year:
+                    continue
+                if not exact and number_tokens(self.normalized[position]) != numbers:
+                    continue
+                if not exact and year and self.years[position] != year:
+                    continue
+            score = 2 * overlap / (len(query) + self.sizes[position])
+            entry_year = self.years[position]
+            if year and entry_year:
+                gap = abs(int(year) - int(entry_year))
+                score += 0.1 if gap == 0 else (-0.1 if gap > 1 else 0.0)
+            if score >= min_score:
+                scored.append((max(score, 0.0), position))
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+
+        # Aliases of one title share an ID, only report its best spelling
+        ranked, seen = [], set()
+        for score, position in scored:
+            key = (self.ids[position], self.types[position])
+            if key in seen:
+                continue
+            seen.add(key)
+            ranked.append((score, self.entry(position)))
+            if len(ranked) == limit:
+                break
+        return ranked
+
+    def entry(self, position: int) -> Dict:
+        """Return an indexed title shaped like a TMDB search result"""
+        date_key = "release_date" if self.types[position] == "movie" else "first_air_date"
+        name_key = "title" if self.types[position] == "movie" else "name"
+        return {
+            "id": self.ids[position],
+            name_key: self.titles[position],
+            date_key: self.years[position],
+        }
+
+
+def best_match(title: str, results: List[Dict], min_score: float = 0.5) -> Optional[Dict]:
+    """
+    Pick the search result whose title best matches the query
+
+    TMDB orders results by popularity, so a popular near-miss can outrank
+    the exact title. Falls back to TMDB's first result when nothing scores
+    at least min_score.
+    """
+    if not results:
+        return None
+
+    query_title, year = split_year(title)
+    query = trigrams(normalize_title(query_title))
+    best, best_score = results[0], min_score
+    for result in results:
+        name = result.get("title") or result.get("name") or ""
+        grams = trigrams(normalize_title(name))
+        score = 2 * len(query & grams) / (len(query) + len(grams))
+        date = result.get("release_date") or result.get("first_air_date") or ""
+        if year and date[:4] == year:
+            score += 0.1
+        if score > best_score:
+            best, best_score = result, score
+    return best
@@ -1,14 +1,81 @@
+import argparse
+import json
 import os
+import threading
 import time
-from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
 import pandas as pd
 import requests
 from dotenv import load_dotenv
 
+from sync_ledger import SyncLedger
+
+
+def _retry_after(headers, default: float = 1.0) -> float:
+    """Seconds to wait from a Retry-After header, given in seconds or as an HTTP date"""
+    value = headers.get("Retry-After") if headers else None
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+
+class RateLimiter:
+    def __init__(self, min_interval: float):
+        """
+        Space requests at least min_interval seconds apart across threads
+
+        Trakt allows roughly one authenticated POST per second and answers
+        429 with a Retry-After header when that is exceeded.
+        """
+        self.min_interval = min_interval
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller for the given number of seconds"""
+        with self.lock:
+            self.next_slot = max(self.next_slot, time.monotonic() + seconds)
+
 
 class TraktSync:
-    def __init__(self, client_id: str, client_secret: str):
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        chunk_size: int = 500,
+        max_workers: int = 2,
+        min_post_interval: float = 1.0,
+        max_retries: int = 3,
+        token_path: Optional[str] = None,
+    ):
+        """
+        Args:
+            client_id: Trakt API client ID
+            client_secret: Trakt API client secret
+            chunk_size: Items sent per /sync/collection request
+            max_workers: Chunk uploads allowed in flight at once
+            min_post_interval: Minimum seconds between POST requests
+            max_retries: Retries for a chunk that fails or is rate limited
+            token_path: File the OAuth tokens are cached in between runs
+        """
         self.client_id = client_id
         self.client_secret = client_secret
         self.base_url = "https://api.trakt.tv"
@@ -18,8 +85,83 @@ class TraktSync:
             "trakt-api-key": client_id,
         }
         self.access_token = None
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.rate_limiter = RateLimiter(min_post_interval)
+        self.session = requests.Session()
+        self.token_path = token_path or os.path.join(
+            os.path.expanduser("~"), ".config", "trakt_sync", "token.json"
+        )
+
+    def _load_token(self) -> Optional[Dict]:
+        try:
+            with open(self.token_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save_token(self, token_data: Dict) -> None:
+        """Write the token response to disk, readable only by the current user"""
+        os.makedirs(os.path.dirname(self.token_path), mode=0o700, exist_ok=True)
+        fd = os.open(self.token_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(token_data, f)
+
+    def _use_token(self, token_data: Dict, save: bool = True) -> None:
+        if "created_at" not in token_data:
+            token_data["created_at"] = int(time.time())
+        if save:
+            self._save_token(token_data)
+        self.access_token = token_data["access_token"]
+        self.headers["Authorization"] = f"Bearer {self.access_token}"
+
+    def _refresh_token(self, refresh_token: str) -> Optional[Dict]:
+        response = self.session.post(
+            f"{self.base_url}/oauth/token",
+            json={
+                "refresh_token": refresh_token,
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "redirect_uri": "urn:ietf:wg:oauth:2.0:oob",
+                "grant_type": "refresh_token",
+            },
+            timeout=30,
+        )
+        if response.status_code == 200:
+            return response.json()
+        print(f"Could not refresh token: {response.text}")
+        return None
 
-    def authenticate(self):
+    def authenticate(
+        self, refresh_fraction: float = 0.1, max_refresh_margin: int = 7 * 24 * 3600
+    ):
+        """
+        Authenticate using the cached token when possible.
+
+        A cached token is reused as is, refreshed once the last
+        refresh_fraction of its lifetime (at most max_refresh_margin seconds)
+        has begun, and the interactive device flow only runs when there is no
+        usable token.
+        """
+        token_data = self._load_token()
+        if token_data:
+            expires_in = token_data.get("expires_in", 0)
+            expires_at = token_data.get("created_at", 0) + expires_in
+            refresh_margin = min(expires_in * refresh_fraction, max_refresh_margin)
+            if time.time() < expires_at - refresh_margin:
+                self._use_token(token_data, save=False)
+                return
+
+            refreshed = self._refresh_token(token_data.get("refresh_token", ""))
+            if refreshed:
+                self._use_token(refreshed)
+                print("Refreshed Trakt access token")
+                return
+
+        self.device_authenticate()
+
+    def device_authenticate(self):
         """
         Perform device authentication flow.
         Returns the access token needed for API calls.
@@ -50,58 +192,293 @@ class TraktSync:
             )
 
             if response.status_code == 200:
-                token_data = response.json()
-                self.access_token = token_data["access_token"]
-                self.headers["Authorization"] = f"Bearer {self.access_token}"
+                self._use_token(response.json())
                 print("Successfully authenticated!")
                 break
             elif response.status_code != 400:  # 400 means still waiting
                 print(f"Error: {response.text}")
                 break
 
-    def add_to_collection(self, items: List[Dict], media_type: str):
+    def fetch_collection(self, media_type: str) -> Set[int]:
         """
-        Add items to Trakt collection
+        Fetch the TMDB IDs currently in the Trakt collection
         media_type: either 'movies' or 'shows'
         """
         if not self.access_token:
             raise Exception("Not authenticated. Call authenticate() first.")
 
-        # Format payload based on media type
-        if media_type == "movies":
-            payload = {"movies": [{"ids": {"tmdb": item["tmdb_id"]}} for item in items]}
-        else:  # shows
-            payload = {"shows": [{"ids": {"tmdb": item["tmdb_id"]}} for item in items]}
-
-        response = requests.post(
-            f"{self.base_url}/sync/collection", headers=self.headers, json=payload
+        response = self.session.get(
+            f"{self.base_url}/sync/collection/{media_type}",
+            headers=self.headers,
+            timeout=60,
         )
+        response.raise_for_status()
 
-        if response.status_code == 201:
-            print(f"Successfully added {len(items)} {media_type} to collection!")
-            return response.json()
+        key = "movie" if media_type == "movies" else "show"
+        return {
+            item[key]["ids"]["tmdb"]
+            for item in response.json()
+            if item.get(key, {}).get("ids", {}).get("tmdb") is not None
+        }
+
+    def _post_chunk(self, chunk: List[int], media_type: str) -> Dict:
+        """
+        POST one chunk of TMDB IDs to /sync/collection, retrying on failure
+
+        Returns:
+            Dict with the parsed response ('response', None if the chunk
+            failed for good), the request latency in seconds ('latency') and
+            whether a failed chunk is worth sending again later ('retryable',
+            False when Trakt rejected it with a client error)
+        """
+        payload = {media_type: [{"ids": {"tmdb": tmdb_id}} for tmdb_id in chunk]}
+
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.wait()
+            start = time.perf_counter()
+            try:
+                response = self.session.post(
+                    f"{self.base_url}/sync/collection",
+                    headers=self.headers,
+                    json=payload,
+                    timeout=60,
+                )
+            except requests.exceptions.RequestException as e:
+                print(f"Error sending chunk of {len(chunk)} {media_type}: {str(e)}")
+                self.rate_limiter.pause(2**attempt)
+                continue
+            latency = time.perf_counter() - start
+
+            if response.status_code == 201:
+                return {"response": response.json(), "latency": latency, "retryable": False}
+
+            if response.status_code == 429:
+                self.rate_limiter.pause(_retry_after(response.headers))
+            elif response.status_code >= 500:
+                self.rate_limiter.pause(2**attempt)
+            else:
+                # Other client errors will not succeed on retry
+                print(f"Error adding {media_type}: {response.text}")
+                return {"response": None, "latency": 0.0, "retryable": False}
+
+        return {"response": None, "latency": 0.0, "retryable": True}
+
+    def _upload(self, tmdb_ids: List[int], media_type: str) -> Dict:
+        """Upload IDs in chunks with bounded concurrency and merge the responses"""
+        chunks = [
+            tmdb_ids[i : i + self.chunk_size]
+            for i in range(0, len(tmdb_ids), self.chunk_size)
+        ]
+        summary = {
+            "added": 0,
+            "existing": 0,
+            "not_found": [],
+            "failed": [],
+            "retryable": [],
+            "latencies": [],
+        }
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = executor.map(
+                lambda chunk: self._post_chunk(chunk, media_type), chunks
+            )
+            for chunk, result in zip(chunks, results):
+                response = result["response"]
+                if response is None:
+                    summary["failed"].extend(chunk)
+                    if result["retryable"]:
+                        summary["retryable"].extend(chunk)
+                    continue
+                summary["latencies"].append(result["latency"])
+                summary["added"] += response.get("added", {}).get(media_type, 0)
+                summary["existing"] += response.get("existing", {}).get(media_type, 0)
+                summary["not_found"].extend(
+                    item["ids"]["tmdb"]
+                    for item in response.get("not_found", {}).get(media_type, [])
+                    if item.get("ids", {}).get("tmdb") is not None
+                )
+
+        return summary
+
+    def add_to_collection(
+        self, tmdb_ids: List[int], media_type: str
+    ) -> Optional[Dict]:
+        """
+        Add TMDB IDs to Trakt collection
+        media_type: either 'movies' or 'shows'
+
+        Items are uploaded in chunks of chunk_size. Chunks that fail are
+        retried as a whole, and those that still failed on network errors,
+        rate limits or server errors are uploaded once more at the end.
+        Items Trakt reports as not_found are not retried.
+
+        Returns a summary with added/existing counts and the TMDB IDs that
+        were not found or failed, or None if nothing was uploaded.
+        """
+        if not self.access_token:
+            raise Exception("Not authenticated. Call authenticate() first.")
+
+        start = time.perf_counter()
+        summary = self._upload(tmdb_ids, media_type)
+
+        # Give chunks that failed transiently one more pass
+        retryable = summary.pop("retryable")
+        if retryable:
+            retry = self._upload(retryable, media_type)
+            summary["added"] += retry["added"]
+            summary["existing"] += retry["existing"]
+            summary["not_found"].extend(retry["not_found"])
+            retried = set(retryable)
+            summary["failed"] = [
+                tmdb_id for tmdb_id in summary["failed"] if tmdb_id not in retried
+            ] + retry["failed"]
+            summary["latencies"].extend(retry["latencies"])
+
+        elapsed = time.perf_counter() - start
+        latencies = summary.pop("latencies")
+        uploaded = len(tmdb_ids) - len(summary["failed"])
+
+        print(
+            f"Added {summary['added']} {media_type} to collection "
+            f"({summary['existing']} already there, {len(summary['not_found'])} not found, "
+            f"{len(summary['failed'])} failed)"
+        )
+        if latencies:
+            print(
+                f"{len(latencies)} chunks, {uploaded / elapsed:.1f} items/s, "
+                f"chunk latency min {min(latencies):.2f}s / "
+                f"avg {sum(latencies) / len(latencies):.2f}s / "
+                f"max {max(latencies):.2f}s"
+            )
         else:
-            print(f"Error adding {media_type}: {response.text}")
             return None
 
+        return summary
+
+
+def _valid_ids(ids: pd.Series, seen: Set[int]) -> List[int]:
+    """Drop missing, non-positive and already seen IDs from a chunk"""
+    ids = ids.dropna()
+    ids = ids[ids > 0].drop_duplicates()
+    ids = ids[~ids.isin(seen)].astype("int64").tolist()
+    seen.update(ids)
+    return ids
+
 
-def process_file(filename: str):
+def read_tmdb_ids(filename: str, chunksize: int = 50_000) -> Iterator[List[int]]:
     """
-    Process a CSV file and determine its media type
-    Returns tuple of (items, media_type)
+    Stream unique, valid TMDB IDs from a CSV in chunks
+
+    Only the tmdb_id column is parsed, as a nullable integer. Blank,
+    non-numeric and non-positive IDs are skipped, as are IDs already seen
+    in an earlier chunk.
     """
-    df = pd.read_csv(filename)
+    seen: Set[int] = set()
+    try:
+        for chunk in pd.read_csv(
+            filename, usecols=["tmdb_id"], dtype={"tmdb_id": "Int64"}, chunksize=chunksize
+        ):
+            yield _valid_ids(chunk["tmdb_id"], seen)
+        return
+    except (ValueError, TypeError):
+        # Some value is not an integer, fall back to coercing each chunk.
+        # Chunks already yielded are skipped again via `seen`.
+        pass
+
+    for chunk in pd.read_csv(
+        filename, usecols=["tmdb_id"], dtype={"tmdb_id": "string"}, chunksize=chunksize
+    ):
+        ids = pd.to_numeric(chunk["tmdb_id"], errors="coerce")
+        ids = ids[ids == ids.round()].astype("Int64")
+        yield _valid_ids(ids, seen)
 
+
+def process_file(filename: str, chunksize: int = 50_000) -> Tuple[Iterator[List[int]], str]:
+    """
+    Process a CSV file and determine its media type
+    Returns tuple of (chunks of TMDB IDs, media_type)
+    """
     # Try to determine if this is a movie or show file based on filename
     media_type = "movies" if "movie" in filename.lower() else "shows"
 
-    # Convert DataFrame to list of dictionaries
-    items = df.to_dict("records")
+    return read_tmdb_ids(filename, chunksize), media_type
 
-    return items, media_type
+
+def sync_file(
+    trakt: TraktSync,
+    ledger: SyncLedger,
+    filename: str,
+    dry_run: bool = False,
+    fetch_remote: bool = False,
+) -> None:
+    """
+    Upload the items of one CSV that are not already in the collection
+
+    IDs recorded in the ledger (and, with fetch_remote, IDs already in the
+    remote collection) are skipped, so re-running on an unchanged library
+    makes no write calls. IDs are read and uploaded one chunk at a time.
+    A dry run writes neither to Trakt nor to the ledger.
+    """
+    id_chunks, media_type = process_file(filename)
+
+    synced = ledger.synced_ids(media_type)
+    if fetch_remote:
+        remote = trakt.fetch_collection(media_type)
+        print(f"Remote collection has {len(remote)} {media_type}")
+        if not dry_run:
+            ledger.record(remote, media_type)
+        synced |= remote
+    total = new_total = 0
+    for tmdb_ids in id_chunks:
+        new_ids = [tmdb_id for tmdb_id in tmdb_ids if tmdb_id not in synced]
+        total += len(tmdb_ids)
+        new_total += len(new_ids)
+
+        if dry_run:
+            for tmdb_id in new_ids:
+                print(f"  would add: tmdb {tmdb_id}")
+            continue
+        if not new_ids:
+            continue
+
+        summary = trakt.add_to_collection(new_ids, media_type)
+        if summary:
+            unresolved = set(summary["not_found"]) | set(summary["failed"])
+            ledger.record(
+                (tmdb_id for tmdb_id in new_ids if tmdb_id not in unresolved),
+                media_type,
+            )
+
+    print(
+        f"{filename}: {total} {media_type}, "
+        f"{total - new_total} already synced, {new_total} "
+        + ("to upload" if dry_run else "uploaded")
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sync movies and shows to Trakt")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Report what would be uploaded without writing to Trakt",
+    )
+    parser.add_argument(
+        "--fetch-remote",
+        action="store_true",
+        help="Seed the local ledger from the current Trakt collection first",
+    )
+    parser.add_argument(
+        "--ledger",
+        default="trakt_ledger.sqlite",
+        help="SQLite file recording already synced TMDB IDs",
+    )
+    return parser.parse_args()
 
 
 def main():
+    args = parse_args()
+
     # Load environment variables from .env file
     load_dotenv()
 
@@ -116,19 +493,18 @@ def main():
 
     # Create TraktSync instance
     trakt = TraktSync(client_id, client_secret)
+    ledger = SyncLedger(args.ledger, read_only=args.dry_run)
 
-    # Authenticate
-    trakt.authenticate()
+    # A dry run against the local ledger needs no API access at all
+    if not args.dry_run or args.fetch_remote:
+        trakt.authenticate()
 
-    # Process movies if file exists
-    if os.path.exists("../TMDB_ID_finder/radarr_import.csv"):
-        items, media_type = process_file("movies.csv")
-        trakt.add_to_collection(items, media_type)
+    # Process movies and shows if the files exist
+    for filename in ("movies.csv", "shows.csv"):
+        if os.path.exists(filename):
+            sync_file(trakt, ledger, filename, args.dry_run, args.fetch_remote)
 
-    # Process shows if file exists
-    if os.path.exists("../TMDB_ID_finder/sonarr_import.csv"):
-        items, media_type = process_file("shows.csv")
-        trakt.add_to_collection(items, media_type)
+    ledger.close()
 
 
 if __name__ == "__main__":
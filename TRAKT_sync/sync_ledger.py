@@ -0,0 +1,55 @@
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable, Set
+
+
+class SyncLedger:
+    def __init__(self, path: str = "trakt_ledger.sqlite", read_only: bool = False):
+        """
+        Local record of TMDB IDs already in the Trakt collection
+
+        Args:
+            path: SQLite database file
+            read_only: Never write to path, e.g. for a dry run; a missing
+                file reads as an empty ledger
+        """
+        if not read_only:
+            self.conn = sqlite3.connect(path)
+        elif os.path.exists(path):
+            uri = f"{Path(path).absolute().as_uri()}?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True)
+        else:
+            self.conn = sqlite3.connect(":memory:")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS synced (
+                media_type TEXT NOT NULL,
+                tmdb_id INTEGER NOT NULL,
+                synced_at REAL NOT NULL,
+                PRIMARY KEY (media_type, tmdb_id)
+            ) WITHOUT ROWID
+            """
+        )
+        self.conn.commit()
+
+    def synced_ids(self, media_type: str) -> Set[int]:
+        """All TMDB IDs recorded for a media type ('movies' or 'shows')"""
+        rows = self.conn.execute(
+            "SELECT tmdb_id FROM synced WHERE media_type = ?", (media_type,)
+        )
+        return {tmdb_id for (tmdb_id,) in rows}
+
+    def record(self, tmdb_ids: Iterable[int], media_type: str) -> None:
+        """Mark IDs as present in the Trakt collection"""
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO synced (media_type, tmdb_id, synced_at)"
+            " VALUES (?, ?, ?)",
+            ((media_type, int(tmdb_id), now) for tmdb_id in tmdb_ids),
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
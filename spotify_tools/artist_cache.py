@@ -0,0 +1,238 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.getenv(
+    "SPOTIFY_ARTIST_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "spotify_tools", "artists.sqlite"),
+)
+
+# Maximum number of IDs accepted by the Spotify several-artists endpoint
+ARTIST_BATCH_SIZE = 50
+
+
+class ArtistCache:
+    """Artist metadata and related-artist lists shared by the spotify_tools scripts"""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        ttl: float = 14 * 24 * 3600,
+        max_entries: int = 500_000,
+        max_related: int = 100_000,
+    ):
+        """
+        Args:
+            path: SQLite database file
+            ttl: Seconds before a cached artist or related list is fetched again
+            max_entries: Least recently used artists are evicted beyond this
+            max_related: Least recently used related lists are evicted beyond this
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_related = max_related
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS artists (
+                artist_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                fetched REAL NOT NULL,
+                accessed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS artists_accessed ON artists (accessed);
+            CREATE TABLE IF NOT EXISTS related (
+                artist_id TEXT PRIMARY KEY,
+                related_ids TEXT NOT NULL,
+                fetched REAL NOT NULL,
+                accessed REAL NOT NULL
+            );
+            """
+        )
+        # Caches created before related lists were evicted lack the column
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(related)")}
+        if "accessed" not in columns:
+            self.conn.execute(
+                "ALTER TABLE related ADD COLUMN accessed REAL NOT NULL DEFAULT 0"
+            )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS related_accessed ON related (accessed)")
+        self.conn.commit()
+
+    def get_many(self, artist_ids: Iterable[str]) -> Dict[str, Dict]:
+        """Return fresh cached artists by ID; missing or stale ones are left out"""
+        artist_ids = list(dict.fromkeys(artist_ids))
+        now = time.time()
+        found = {}
+        with self.lock:
+            # Stay well below SQLite's bound parameter limit
+            for i in range(0, len(artist_ids), 500):
+                batch = artist_ids[i : i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT artist_id, data FROM artists"
+                    f" WHERE artist_id IN ({placeholders}) AND fetched >= ?",
+                    batch + [now - self.ttl],
+                ).fetchall()
+                for artist_id, data in rows:
+                    found[artist_id] = json.loads(data)
+            if found:
+                self.conn.executemany(
+                    "UPDATE artists SET accessed = ? WHERE artist_id = ?",
+                    ((now, artist_id) for artist_id in found),
+                )
+                self.conn.commit()
+            self.hits += len(found)
+            self.misses += len(artist_ids) - len(found)
+        return found
+
+    def get(self, artist_id: str) -> Optional[Dict]:
+        return self.get_many([artist_id]).get(artist_id)
+
+    def put_many(self, artists: Iterable[Dict]) -> None:
+        """Store artist objects as returned by the Spotify API"""
+        now = time.time()
+        rows = [
+            (artist["id"], json.dumps(_slim(artist)), now, now)
+            for artist in artists
+            if artist
+        ]
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO artists (artist_id, data, fetched, accessed)"
+                " VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._evict("artists", self.max_entries)
+            self.conn.commit()
+
+    def get_related(self, artist_id: str) -> Optional[List[str]]:
+        """Return cached related artist IDs, or None if missing or stale"""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT related_ids FROM related WHERE artist_id = ? AND fetched >= ?",
+                (artist_id, now - self.ttl),
+            ).fetchone()
+            if row:
+                self.conn.execute(
+                    "UPDATE related SET accessed = ? WHERE artist_id = ?", (now, artist_id)
+                )
+                self.conn.commit()
+        return json.loads(row[0]) if row else None
+
+    def put_related(self, artist_id: str, related_ids: List[str]) -> None:
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO related (artist_id, related_ids, fetched, accessed)"
+                " VALUES (?, ?, ?, ?)",
+                (artist_id, json.dumps(related_ids), now, now),
+            )
+            self._evict("related", self.max_related)
+            self.conn.commit()
+
+    def _evict(self, table: str, max_entries: int) -> None:
+        """Drop the least recently used rows of table beyond max_entries"""
+        count = self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        excess = count - max_entries
+        if excess > 0:
+            self.conn.execute(
+                f"DELETE FROM {table} WHERE artist_id IN"
+                f" (SELECT artist_id FROM {table} ORDER BY accessed LIMIT ?)",
+                (excess,),
+            )
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0.0
+        return f"Artist cache hits: {self.hits}, misses: {self.misses} ({rate:.1f}% hit rate)"
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+
+_default_cache: Optional[ArtistCache] = None
+_default_lock = threading.Lock()
+
+
+def default_cache() -> ArtistCache:
+    """The process-wide cache, so every caller shares one SQLite connection"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ArtistCache()
+        return _default_cache
+
+
+def close_default_cache() -> None:
+    """Close the process-wide cache; the next default_cache() call reopens it"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is not None:
+            _default_cache.close()
+            _default_cache = None
+
+
+def _slim(artist: Dict) -> Dict:
+    """Keep only the artist fields the scripts use"""
+    return {
+        "id": artist["id"],
+        "name": artist.get("name", ""),
+        "genres": artist.get("genres", []),
+        "popularity": artist.get("popularity", 0),
+    }
+
+
+def fetch_artists(sp, artist_ids: Iterable[str], cache: ArtistCache) -> Dict[str, Dict]:
+    """
+    Resolve artists by ID from the cache, fetching misses 50 per request
+
+    Returns:
+        Dict of artist ID to {"id", "name", "genres", "popularity"}
+    """
+    artist_ids = list(dict.fromkeys(artist_id for artist_id in artist_ids if artist_id))
+    artists = cache.get_many(artist_ids)
+    missing = [artist_id for artist_id in artist_ids if artist_id not in artists]
+
+    for i in range(0, len(missing), ARTIST_BATCH_SIZE):
+        batch = missing[i : i + ARTIST_BATCH_SIZE]
+        try:
+            fetched = [artist for artist in sp.artists(batch)["artists"] if artist]
+        except Exception as e:
+            logger.error(f"Error getting artists: {str(e)}")
+            continue
+        cache.put_many(fetched)
+        artists.update((artist["id"], _slim(artist)) for artist in fetched)
+
+    return artists
+
+
+def fetch_related_artists(sp, artist_id: str, cache: ArtistCache) -> List[Dict]:
+    """
+    Related artists of an artist, from the cache when fresh
+
+    Returns:
+        List of {"id", "name", "genres", "popularity"} in Spotify's order
+    """
+    related_ids = cache.get_related(artist_id)
+    if related_ids is None:
+        related = [artist for artist in sp.artist_related_artists(artist_id)["artists"] if artist]
+        cache.put_many(related)
+        cache.put_related(artist_id, [artist["id"] for artist in related])
+        return [_slim(artist) for artist in related]
+    artists = fetch_artists(sp, related_ids, cache)
+    return [artists[related_id] for related_id in related_ids if related_id in artists]
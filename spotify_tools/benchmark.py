@@ -0,0 +1,271 @@
+import argparse
+import contextlib
+import glob
+import importlib.util
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Runs must never read or write the real artist cache; artist_cache picks
+# its default path up from the environment when it is first imported.
+# The directory is removed at exit even if main() is never called.
+_bench_dir = tempfile.TemporaryDirectory(prefix="spotify_bench_")
+BENCH_DIR = _bench_dir.name
+os.environ["SPOTIFY_ARTIST_CACHE"] = os.path.join(BENCH_DIR, "artists.sqlite")
+
+# Configure the root logger before the scripts do, so only errors are shown
+logging.basicConfig(level=logging.ERROR, format="%(levelname)s - %(name)s - %(message)s")
+
+from artist_cache import close_default_cache  # noqa: E402
+from rate_limit import RateLimitedSpotify, RequestScheduler  # noqa: E402
+from replay_client import ReplayClient, synthetic_fixture  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent
+PLAYLIST_ID = "replay_playlist"
+
+SCRIPTS = {
+    "grab": ROOT / "get_genres_from_playlist" / "grab_genres_from_playlist.py",
+    "move": ROOT / "edit_playlists" / "src" / "move_tracks.py",
+    "view": ROOT / "research" / "view_genre_structure.py",
+}
+
+
+class ErrorCounter(logging.Handler):
+    """Counts error records, since the scripts log failures instead of raising"""
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+_modules = {}
+
+
+def load_script(path: Path):
+    """Import a script by path, with its own directory importable like when run directly"""
+    if path in _modules:
+        return _modules[path]
+    sys.path.insert(0, str(path.parent))
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    _modules[path] = module
+    return module
+
+
+def run_grab(module, sp, workdir):
+    module.analyze_playlist(PLAYLIST_ID)
+
+
+def run_move(module, sp, workdir):
+    # Move every tenth track, matched by URI
+    items = sp.playlists[PLAYLIST_ID]["items"]
+    tracklist = [item["track"]["uri"] for item in items[::10]]
+    module.move_tracks(
+        PLAYLIST_ID, tracklist, "uri", journal_path=os.path.join(workdir, "move_journal.json")
+    )
+
+
+def run_view(module, sp, workdir):
+    os.environ["SPOTIFY_PLAYLIST_ID"] = PLAYLIST_ID
+    with contextlib.redirect_stdout(io.StringIO()):
+        module.analyze_genre_patterns(show_artists=False)
+
+
+RUNNERS = {"grab": run_grab, "move": run_move, "view": run_view}
+
+
+def run_once(name, module, size, client_options, rps, measure_memory):
+    """
+    Run one script against a fresh fixture and a cold artist cache
+
+    The replay client is wrapped in its own request scheduler, as
+    setup_spotify does for the real one, limited to rps requests/second.
+    """
+    close_default_cache()
+    for path in glob.glob(os.environ["SPOTIFY_ARTIST_CACHE"] + "*"):
+        os.remove(path)
+    sp = ReplayClient(synthetic_fixture(size, playlist_id=PLAYLIST_ID), **client_options)
+    scheduler = RequestScheduler(rate=rps, burst=max(int(rps), 1), max_rate=rps)
+    module.setup_spotify = lambda: RateLimitedSpotify(sp, scheduler)
+
+    workdir = tempfile.mkdtemp(dir=BENCH_DIR)
+    errors = ErrorCounter()
+    logging.getLogger().addHandler(errors)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        if measure_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            RUNNERS[name](module, sp, workdir)
+        except Exception as e:
+            # A failing script fails its case, not the whole suite
+            errors.count += 1
+            print(f"{name} @ {size} tracks failed: {e}", file=sys.stderr)
+        wall = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if measure_memory else None
+    finally:
+        if measure_memory:
+            tracemalloc.stop()
+        os.chdir(cwd)
+        logging.getLogger().removeHandler(errors)
+
+    return {
+        "script": name,
+        "tracks": size,
+        "api_calls": sp.total_calls,
+        "calls_by_endpoint": dict(sp.calls),
+        "rate_limited": sp.rate_limited,
+        "retries": scheduler.retries,
+        "queued_s": scheduler.queued_time,
+        "wall_s": wall,
+        "peak_mb": peak / 2**20 if peak is not None else None,
+        "errors": errors.count,
+    }
+
+
+def benchmark(name, size, client_options, rps, repeat=1, measure_memory=True):
+    """
+    Best wall time over repeat runs, plus peak memory from a separate run
+
+    tracemalloc slows allocation-heavy code noticeably, so memory is
+    measured in its own run rather than alongside the timings.
+    """
+    module = load_script(SCRIPTS[name])
+    runs = [run_once(name, module, size, client_options, rps, False) for _ in range(repeat)]
+    result = min(runs, key=lambda run: run["wall_s"])
+    if measure_memory:
+        result["peak_mb"] = run_once(name, module, size, client_options, rps, True)["peak_mb"]
+    return result
+
+
+def find_regressions(results, baseline, tolerance):
+    """Compare against a previous --json output; more calls or errors always count"""
+    previous = {(r["script"], r["tracks"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result["script"], result["tracks"]))
+        if before is None:
+            continue
+        label = f"{result['script']} @ {result['tracks']} tracks"
+        if result["api_calls"] > before["api_calls"]:
+            regressions.append(f"{label}: API calls {before['api_calls']} -> {result['api_calls']}")
+        if result["errors"] > before["errors"]:
+            regressions.append(f"{label}: errors {before['errors']} -> {result['errors']}")
+        if result["wall_s"] > before["wall_s"] * (1 + tolerance):
+            regressions.append(
+                f"{label}: wall time {before['wall_s']:.2f}s -> {result['wall_s']:.2f}s"
+            )
+        if (
+            result["peak_mb"] is not None
+            and before.get("peak_mb") is not None
+            and result["peak_mb"] > before["peak_mb"] * (1 + tolerance)
+        ):
+            regressions.append(
+                f"{label}: peak memory {before['peak_mb']:.1f}MB -> {result['peak_mb']:.1f}MB"
+            )
+    return regressions
+
+
+def print_results(results):
+    print(
+        f"\n{'script':<8}{'tracks':>9}{'calls':>8}{'429s':>6}{'retries':>9}"
+        f"{'queued s':>10}{'wall s':>9}{'peak MB':>9}{'errors':>8}"
+    )
+    for r in results:
+        peak = f"{r['peak_mb']:.1f}" if r["peak_mb"] is not None else "-"
+        print(
+            f"{r['script']:<8}{r['tracks']:>9}{r['api_calls']:>8}{r['rate_limited']:>6}"
+            f"{r['retries']:>9}{r['queued_s']:>10.2f}{r['wall_s']:>9.2f}{peak:>9}{r['errors']:>8}"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Spotify scripts offline against synthetic playlists"
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Playlist sizes"
+    )
+    parser.add_argument(
+        "--scripts", nargs="+", choices=list(SCRIPTS), default=list(SCRIPTS), help="Scripts to run"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Milliseconds added per API call"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="Random extra milliseconds per call"
+    )
+    parser.add_argument(
+        "--rps",
+        type=float,
+        default=1000.0,
+        help="Request scheduler limit in requests/second (default: 1000)",
+    )
+    parser.add_argument(
+        "--rate-limit-every", type=int, default=0, help="Answer every Nth call with a 429"
+    )
+    parser.add_argument(
+        "--retry-after", type=float, default=1.0, help="Retry-After seconds on injected 429s"
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="Timed runs per case, best is kept")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the peak memory runs")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Previous --json results to check for regressions")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="Allowed time/memory growth (default: 0.2)"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        client_options = {
+            "latency": args.latency / 1000,
+            "jitter": args.jitter / 1000,
+            "rate_limit_every": args.rate_limit_every,
+            "retry_after": args.retry_after,
+        }
+
+        results = []
+        for size in args.sizes:
+            for name in args.scripts:
+                result = benchmark(
+                    name, size, client_options, args.rps, args.repeat, not args.no_memory
+                )
+                print(f"{name} @ {size} tracks: {result['wall_s']:.2f}s", flush=True)
+                results.append(result)
+
+        print_results(results)
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+
+        if args.baseline:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                regressions = find_regressions(results, json.load(f), args.tolerance)
+            for regression in regressions:
+                print(f"REGRESSION {regression}")
+            if regressions:
+                sys.exit(1)
+    finally:
+        # The cache's SQLite files must be closed before they can be deleted
+        close_default_cache()
+        _bench_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Spotify API has a limit of 100 tracks per request
+CHUNK_SIZE = 100
+
+PENDING = "pending"
+ADDED = "added"
+REMOVED = "removed"
+
+
+class MoveJournal:
+    def __init__(self, path: str, data: Dict):
+        """
+        On-disk record of a move, updated after every chunk changes state
+
+        data holds the source and target playlist IDs, the source
+        snapshot_id the move was planned against, every source snapshot the
+        move itself produced since, and the chunks of URIs with their status
+        (pending -> added -> removed).
+        """
+        self.path = path
+        self.data = data
+        self.lock = threading.Lock()
+
+    @classmethod
+    def create(
+        cls, path: str, source_id: str, target_id: str, snapshot_id: str, uris: List[str]
+    ) -> "MoveJournal":
+        uris = list(dict.fromkeys(uris))
+        journal = cls(
+            path,
+            {
+                "source": source_id,
+                "target": target_id,
+                "snapshot_id": snapshot_id,
+                "snapshots": [snapshot_id],
+                "chunks": [
+                    {"uris": uris[i : i + CHUNK_SIZE], "status": PENDING}
+                    for i in range(0, len(uris), CHUNK_SIZE)
+                ],
+            },
+        )
+        journal.save()
+        return journal
+
+    @classmethod
+    def load(cls, path: str) -> Optional["MoveJournal"]:
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(path, json.load(f))
+
+    def set_status(self, chunk: Dict, status: str, snapshot_id: Optional[str] = None) -> None:
+        """Record a chunk's new status and the source snapshot_id the change produced"""
+        with self.lock:
+            chunk["status"] = status
+            if snapshot_id:
+                self.data.setdefault("snapshots", [self.data["snapshot_id"]]).append(snapshot_id)
+            self.save()
+
+    def save(self) -> None:
+        """Atomically replace the journal file"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def discard(self) -> None:
+        """Delete the journal once there is nothing left to resume"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @property
+    def complete(self) -> bool:
+        return all(chunk["status"] == REMOVED for chunk in self.data["chunks"])
+
+
+def playlist_uris(sp, playlist_id: str) -> set:
+    """URIs of every track currently in a playlist"""
+    uris = set()
+    results = sp.playlist_items(playlist_id, fields="items(track(uri)),next")
+    while True:
+        uris.update(item["track"]["uri"] for item in results["items"] if item.get("track"))
+        if not results.get("next"):
+            return uris
+        results = sp.next(results)
+
+
+class ChunkMover:
+    def __init__(self, sp, journal: MoveJournal, max_workers: int = 4):
+        """
+        Move journaled chunks from the source playlist to the target
+
+        Adds run in order on the calling thread so the target keeps the
+        source order; each chunk's removal is handed to a pool as soon as
+        its add is confirmed, overlapping with the next add. Removals pass
+        the planned snapshot_id so they apply to the playlist version the
+        tracks were selected from, and a run refuses to start if the source
+        has since been changed by anything but the move itself.
+        """
+        self.sp = sp
+        self.journal = journal
+        self.max_workers = max_workers
+
+    def _snapshot(self, result: Optional[Dict]) -> Optional[str]:
+        return result.get("snapshot_id") if result else None
+
+    def check_source(self) -> None:
+        """Raise if the source playlist was edited outside this move"""
+        data = self.journal.data
+        known = data.get("snapshots", [data["snapshot_id"]])
+        current = self.sp.playlist(data["source"], fields="snapshot_id")["snapshot_id"]
+        if current not in known:
+            raise RuntimeError(
+                f"Source playlist {data['source']} changed since the move was planned "
+                f"(snapshot {current}); refusing to continue, roll back instead"
+            )
+
+    def _remove(self, chunk: Dict) -> None:
+        data = self.journal.data
+        result = self.sp.playlist_remove_all_occurrences_of_items(
+            data["source"], chunk["uris"], snapshot_id=data["snapshot_id"]
+        )
+        self.journal.set_status(chunk, REMOVED, self._snapshot(result))
+        logger.info(f"Removed chunk of {len(chunk['uris'])} tracks from source")
+
+    def run(self) -> None:
+        data = self.journal.data
+        chunks = [chunk for chunk in data["chunks"] if chunk["status"] != REMOVED]
+        if not chunks:
+            return
+        self.check_source()
+
+        # A previous run may have added a chunk without journaling it, so
+        # never add URIs the target already has
+        already_added = set()
+        if any(chunk["status"] == PENDING for chunk in chunks):
+            already_added = playlist_uris(self.sp, data["target"])
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            removals = []
+            for chunk in chunks:
+                if chunk["status"] == PENDING:
+                    to_add = [uri for uri in chunk["uris"] if uri not in already_added]
+                    if to_add:
+                        self.sp.playlist_add_items(data["target"], to_add)
+                    self.journal.set_status(chunk, ADDED)
+                    logger.info(f"Added chunk of {len(to_add)} tracks to target")
+                removals.append(executor.submit(self._remove, chunk))
+
+            # Surface the first failure; the journal keeps what finished
+            for removal in removals:
+                removal.result()
+
+    def rollback(self) -> None:
+        """
+        Undo a move: restore the source, then unfollow the target playlist
+
+        A removal can reach Spotify without being journaled, so every chunk
+        that got past pending is checked against the source's current
+        tracks and whatever is missing is added back. Only then is the
+        target, created for this move, deleted along with the journal so the
+        next move isn't blocked by it.
+        """
+        data = self.journal.data
+        source_uris = playlist_uris(self.sp, data["source"])
+        for chunk in reversed(data["chunks"]):
+            if chunk["status"] == PENDING:
+                continue
+            missing = [uri for uri in chunk["uris"] if uri not in source_uris]
+            snapshot_id = None
+            if missing:
+                result = self.sp.playlist_add_items(data["source"], missing)
+                snapshot_id = self._snapshot(result)
+                logger.info(f"Restored {len(missing)} tracks to source")
+            self.journal.set_status(chunk, PENDING, snapshot_id)
+
+        # Unfollowing is how Spotify deletes a playlist
+        self.sp.current_user_unfollow_playlist(data["target"])
+        logger.info(f"Removed target playlist {data['target']}")
+        self.journal.discard()
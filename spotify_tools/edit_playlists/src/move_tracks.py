@@ -1,17 +1,28 @@
+import argparse
 import logging
 import os
+import sys
+from pathlib import Path
 
 import pandas as pd
-import spotipy
 from dotenv import load_dotenv
 from spotipy.oauth2 import SpotifyOAuth
 
+# Shared spotify_tools modules live two directories up
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from chunk_mover import ChunkMover, MoveJournal  # noqa: E402
+from playlist_pager import get_all_playlist_items  # noqa: E402
+from rate_limit import default_scheduler, spotify_client  # noqa: E402
+from track_matcher import TrackMatcher  # noqa: E402
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger(__name__)
 
+JOURNAL_PATH = "move_journal.json"
+
 
 def load_tracks_from_csv(filepath):
     """Load tracks from CSV file"""
@@ -46,8 +57,8 @@ def setup_spotify():
 
     scope = "playlist-modify-public playlist-modify-private playlist-read-private"
     try:
-        return spotipy.Spotify(
-            auth_manager=SpotifyOAuth(
+        return spotify_client(
+            SpotifyOAuth(
                 client_id=os.getenv("SPOTIFY_CLIENT_ID"),
                 client_secret=os.getenv("SPOTIFY_CLIENT_SECRET"),
                 redirect_uri=os.getenv("SPOTIFY_REDIRECT_URI"),
@@ -100,12 +111,8 @@ def create_new_playlist(sp, name="TBD", description="Progressive tracks"):
 def get_playlist_tracks(sp, playlist_id):
     """Get all tracks from a playlist with validation"""
     try:
-        results = sp.playlist_items(playlist_id)
-        all_tracks = results["items"]
-
-        while results["next"]:
-            results = sp.next(results)
-            all_tracks.extend(results["items"])
+        # Pages are fetched concurrently using the total from the first one
+        all_tracks = get_all_playlist_items(sp, playlist_id)
 
         logger.info(f"Retrieved {len(all_tracks)} tracks from playlist")
 
@@ -124,8 +131,20 @@ def get_playlist_tracks(sp, playlist_id):
         raise
 
 
-def move_tracks(source_playlist_id, progressive_tracks_list):
-    """Move progressive tracks to a new playlist"""
+def move_tracks(
+    source_playlist_id,
+    progressive_tracks_list,
+    match_mode="substring",
+    journal_path=JOURNAL_PATH,
+    max_workers=4,
+):
+    """
+    Move progressive tracks to a new playlist
+
+    match_mode is passed to TrackMatcher: 'substring' (default), 'uri' or 'fuzzy'.
+    Progress is journaled to journal_path so an interrupted move can be
+    finished with resume_move or undone with rollback_move.
+    """
     try:
         # Initialize Spotify client
         sp = setup_spotify()
@@ -135,9 +154,15 @@ def move_tracks(source_playlist_id, progressive_tracks_list):
         if not source_playlist_id:
             raise ValueError("Source playlist ID is required")
 
+        existing = MoveJournal.load(journal_path)
+        if existing and not existing.complete:
+            raise RuntimeError(
+                f"Unfinished move in {journal_path}; run with --resume or --rollback first"
+            )
+
         # Debug: Print the source playlist details
         try:
-            playlist_info = sp.playlist(source_playlist_id, fields="name,id")
+            playlist_info = sp.playlist(source_playlist_id, fields="name,id,snapshot_id")
             logger.info(
                 f"Source playlist found: {playlist_info.get('name', 'Unknown')} ({playlist_info['id']})"
             )
@@ -145,12 +170,12 @@ def move_tracks(source_playlist_id, progressive_tracks_list):
             logger.error(f"Error accessing source playlist: {str(e)}")
             raise
 
-        # Create new playlist
-        new_playlist_id = create_new_playlist(sp)
-
         # Get and validate all tracks from source playlist
         all_tracks = get_playlist_tracks(sp, source_playlist_id)
 
+        # Build the matcher once over the whole tracklist
+        matcher = TrackMatcher(progressive_tracks_list, mode=match_mode)
+
         # Find tracks to move and their URIs
         tracks_to_move = []
         for track in all_tracks:
@@ -160,10 +185,7 @@ def move_tracks(source_playlist_id, progressive_tracks_list):
             # Debug: Print track info
             logger.debug(f"Processing track: {track_name} ({track_uri})")
 
-            if any(
-                prog_track.lower() in track_name.lower()
-                for prog_track in progressive_tracks_list
-            ):
+            if matcher.match(track_name, track_uri) is not None:
                 tracks_to_move.append(track_uri)
                 logger.info(f"Found matching track: {track_name}")
 
@@ -180,32 +202,18 @@ def move_tracks(source_playlist_id, progressive_tracks_list):
                     f"Found {len(tracks_to_move) - len(valid_uris)} invalid URIs"
                 )
 
-            # Spotify API has a limit of 100 tracks per request
-            for i in range(0, len(valid_uris), 100):
-                chunk = valid_uris[i : i + 100]
-                try:
-                    # Debug: Print the chunk we're about to add
-                    logger.debug(f"Adding chunk of {len(chunk)} tracks to new playlist")
-                    logger.debug(f"First URI in chunk: {chunk[0]}")
-
-                    sp.playlist_add_items(new_playlist_id, chunk)
-                    logger.info(f"Successfully added chunk of {len(chunk)} tracks")
-
-                    # Remove from original playlist
-                    sp.playlist_remove_all_occurrences_of_items(
-                        source_playlist_id, chunk
-                    )
-                    logger.info(
-                        f"Successfully removed chunk of {len(chunk)} tracks from source"
-                    )
-                except Exception as e:
-                    logger.error(f"Error processing chunk: {str(e)}")
-                    # Print the problematic URIs
-                    for uri in chunk:
-                        logger.debug(f"URI in failed chunk: {uri}")
-                    raise
-
-            logger.info(f"Successfully moved {len(valid_uris)} tracks to new playlist")
+            # Create new playlist
+            new_playlist_id = create_new_playlist(sp)
+
+            # Removals are pinned to the snapshot the tracks were read from
+            journal = MoveJournal.create(
+                journal_path,
+                source_playlist_id,
+                new_playlist_id,
+                playlist_info["snapshot_id"],
+                valid_uris,
+            )
+            run_journal(sp, journal, max_workers)
         else:
             logger.info("No matching tracks found to move")
 
@@ -214,9 +222,85 @@ def move_tracks(source_playlist_id, progressive_tracks_list):
         raise
 
 
+def run_journal(sp, journal, max_workers=4, rollback=False):
+    """Carry out (or undo) the move recorded in a journal"""
+    mover = ChunkMover(sp, journal, max_workers=max_workers)
+    total = sum(len(chunk["uris"]) for chunk in journal.data["chunks"])
+    try:
+        if rollback:
+            mover.rollback()
+            logger.info(f"Rolled back move of {total} tracks")
+        else:
+            mover.run()
+            logger.info(f"Successfully moved {total} tracks to new playlist")
+    except Exception as e:
+        logger.error(f"Error processing chunk: {str(e)}")
+        logger.error(f"Progress saved to {journal.path}; re-run with --resume or --rollback")
+        raise
+
+
+def resume_move(journal_path=JOURNAL_PATH, rollback=False, max_workers=4):
+    """Finish or undo an interrupted move from its journal"""
+    journal = MoveJournal.load(journal_path)
+    if journal is None:
+        raise FileNotFoundError(f"No move journal found at {journal_path}")
+    sp = setup_spotify()
+    run_journal(sp, journal, max_workers, rollback)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Move tracks listed in a CSV from a playlist to a new playlist"
+    )
+    parser.add_argument(
+        "--tracklist",
+        default="./tracklist.csv",
+        help="CSV with a 'tracks' column (default: ./tracklist.csv)",
+    )
+    parser.add_argument(
+        "--match-mode",
+        choices=TrackMatcher.MODES,
+        default="substring",
+        help="substring: entry appears in the track name (default); "
+        "uri: entries are track URIs/URLs; fuzzy: normalized names are similar",
+    )
+    parser.add_argument(
+        "--journal",
+        default=JOURNAL_PATH,
+        help=f"File recording move progress (default: {JOURNAL_PATH})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Concurrent remove requests while adding (default: 4)",
+    )
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument(
+        "--resume",
+        action="store_true",
+        help="Finish the interrupted move recorded in the journal",
+    )
+    action.add_argument(
+        "--rollback",
+        action="store_true",
+        help="Undo the interrupted move recorded in the journal",
+    )
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
     load_dotenv()
 
+    if args.resume or args.rollback:
+        try:
+            resume_move(args.journal, args.rollback, args.workers)
+        except Exception as e:
+            logger.error(f"Failed to process playlist: {str(e)}")
+        logger.info(default_scheduler().stats())
+        return
+
     # Load source playlist ID from environment
     source_playlist_id = os.getenv("SPOTIFY_PLAYLIST_ID")
     if not source_playlist_id:
@@ -225,12 +309,19 @@ def main():
 
     try:
         # Load tracks from CSV
-        progressive_tracks = load_tracks_from_csv("./tracklist.csv")
+        progressive_tracks = load_tracks_from_csv(args.tracklist)
 
         # Move tracks
-        move_tracks(source_playlist_id, progressive_tracks)
+        move_tracks(
+            source_playlist_id,
+            progressive_tracks,
+            args.match_mode,
+            args.journal,
+            args.workers,
+        )
     except Exception as e:
         logger.error(f"Failed to process playlist: {str(e)}")
+    logger.info(default_scheduler().stats())
 
 
 if __name__ == "__main__":
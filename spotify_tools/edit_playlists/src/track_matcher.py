@@ -0,0 +1,185 @@
+import difflib
+import heapq
+import re
+import unicodedata
+from collections import Counter, defaultdict, deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+TRACK_URI_PATTERN = re.compile(
+    r"(?:spotify:track:|open\.spotify\.com/track/)([A-Za-z0-9]{22})"
+)
+NUMBER_PATTERN = re.compile(r"\d+")
+
+# Fuzzy candidates scored with difflib per track, best trigram overlap first
+FUZZY_SHORTLIST = 5
+
+
+class AhoCorasick:
+    def __init__(self, patterns: Iterable[str]):
+        """
+        Multi-pattern substring matcher
+
+        The automaton is built once over all patterns; searching a text is
+        then linear in its length however many patterns there are.
+        """
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[Optional[str]] = [None]
+
+        for pattern in patterns:
+            node = 0
+            for char in pattern:
+                next_node = self.goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(None)
+                    self.goto[node][char] = next_node
+                node = next_node
+            if self.output[node] is None:
+                self.output[node] = pattern
+
+        # Breadth-first pass setting failure links; each node also inherits
+        # the match of its failure node so search only checks one slot
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                if self.output[child] is None:
+                    self.output[child] = self.output[self.fail[child]]
+
+    def first_match(self, text: str) -> Optional[str]:
+        """Return a pattern occurring in text, or None"""
+        node = 0
+        goto, fail, output = self.goto, self.fail, self.output
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node] is not None:
+                return output[node]
+        return None
+
+
+def normalize_name(name: str) -> str:
+    """
+    Loose form of a track name for fuzzy matching
+
+    Lowercases, strips accents, drops bracketed parts and ' - ... Mix/Edit'
+    style suffixes, and removes punctuation.
+    """
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c)).lower()
+    name = re.sub(r"[\(\[].*?[\)\]]", " ", name)
+    name = re.sub(r"\s-\s.*$", " ", name)
+    name = re.sub(r"[^\w\s]", " ", name)
+    return " ".join(name.split())
+
+
+def trigrams(name: str) -> set:
+    """Character trigrams of a normalized name, padded so short names still match"""
+    padded = f"  {name} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def numbers(name: str) -> Tuple[str, ...]:
+    """Numbers in a name, which tell parts and versions apart ("part 1" / "part 2")"""
+    return tuple(NUMBER_PATTERN.findall(name))
+
+
+class TrackMatcher:
+    MODES = ("substring", "uri", "fuzzy")
+
+    def __init__(self, patterns: Iterable[str], mode: str = "substring", cutoff: float = 0.85):
+        """
+        Decide which playlist tracks match a tracklist
+
+        Args:
+            patterns: Entries of tracklist.csv
+            mode: 'substring' - a pattern occurs in the track name, ignoring case
+                  'uri' - the track's URI is listed (spotify:track:... or a track URL)
+                  'fuzzy' - normalized names are equal, or contain the same
+                  numbers and are closer than cutoff
+            cutoff: Minimum difflib similarity for fuzzy matches
+
+        Fuzzy mode indexes the names by their numbers and trigrams once, so
+        each track is only compared with difflib against the few names with
+        the same numbers sharing most trigrams with it, instead of against
+        the whole tracklist.
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown match mode {mode!r}, expected one of {self.MODES}")
+        self.mode = mode
+        self.cutoff = cutoff
+        patterns = [str(pattern) for pattern in patterns]
+
+        if mode == "uri":
+            self.uris = {
+                f"spotify:track:{match.group(1)}"
+                for match in map(TRACK_URI_PATTERN.search, patterns)
+                if match
+            }
+        elif mode == "fuzzy":
+            self.names = {normalize_name(p): p for p in patterns if normalize_name(p)}
+            self.name_list = list(self.names)
+            self.sizes = []
+            self.postings: Dict[Tuple, List[int]] = defaultdict(list)
+            for position, name in enumerate(self.name_list):
+                grams = trigrams(name)
+                name_numbers = numbers(name)
+                self.sizes.append(len(grams))
+                for gram in grams:
+                    self.postings[name_numbers, gram].append(position)
+        else:
+            lowered = [pattern.lower() for pattern in patterns]
+            # An empty pattern is a substring of every name
+            self.match_all = "" in lowered
+            self.automaton = AhoCorasick(p for p in lowered if p)
+
+    def match(self, track_name: str, track_uri: str = "") -> Optional[str]:
+        """Return the tracklist entry a track matches, or None"""
+        if self.mode == "uri":
+            return track_uri if track_uri in self.uris else None
+        if self.mode == "fuzzy":
+            name = normalize_name(track_name)
+            if name in self.names:
+                return self.names[name]
+            return self._closest(name)
+        if self.match_all:
+            return ""
+        return self.automaton.first_match(track_name.lower())
+
+    def _closest(self, name: str) -> Optional[str]:
+        grams = trigrams(name)
+        name_numbers = numbers(name)
+        overlaps = Counter()
+        for gram in grams:
+            postings = self.postings.get((name_numbers, gram))
+            if postings:
+                overlaps.update(postings)
+        if not overlaps:
+            return None
+
+        # Shortlist by trigram Dice coefficient, then score with difflib
+        shortlist = heapq.nlargest(
+            FUZZY_SHORTLIST,
+            overlaps,
+            key=lambda position: overlaps[position] / (len(grams) + self.sizes[position]),
+        )
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(name)
+        best, best_score = None, self.cutoff
+        for position in shortlist:
+            matcher.set_seq1(self.name_list[position])
+            if matcher.real_quick_ratio() < best_score or matcher.quick_ratio() < best_score:
+                continue
+            score = matcher.ratio()
+            if score >= best_score:
+                best, best_score = position, score
+        return self.names[self.name_list[best]] if best is not None else None
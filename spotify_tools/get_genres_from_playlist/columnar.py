@@ -0,0 +1,115 @@
+import os
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional, only the columnar formats need it
+    pa = None
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+# Few distinct values repeated across many tracks
+DICTIONARY_COLUMNS = {"artist_name", "album"}
+LIST_COLUMNS = {"genres", "playlists"}
+INT_COLUMNS = {"popularity"}
+
+
+def require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("pyarrow is required for Parquet/Arrow output: pip install pyarrow")
+
+
+def _column(name: str, values: List):
+    if name in LIST_COLUMNS:
+        return pa.array(values, type=pa.list_(pa.string()))
+    if name in INT_COLUMNS:
+        return pa.array(values, type=pa.int32())
+    array = pa.array(values, type=pa.string())
+    return array.dictionary_encode() if name in DICTIONARY_COLUMNS else array
+
+
+def track_table(track_details: Sequence[Dict]) -> "pa.Table":
+    """
+    Arrow table with one row per track
+
+    genres (and playlists, when present) are native list<string> columns,
+    artist_name and album are dictionary encoded.
+    """
+    require_pyarrow()
+    names = list(track_details[0]) if track_details else ["track_name", "artist_name", "genres"]
+    return pa.table(
+        {name: _column(name, [track.get(name) for track in track_details]) for name in names}
+    )
+
+
+def write_tracks(track_details: Sequence[Dict], path: str) -> str:
+    """
+    Write track details as Parquet or Arrow IPC, chosen by path's extension
+
+    Parquet is compressed and smallest on disk; the Arrow file is left
+    uncompressed so read_tracks can memory-map it without copying.
+    """
+    return _write_table(track_table(track_details), path)
+
+
+def write_genres(genres_df: pd.DataFrame, path: str) -> str:
+    """
+    Write the (track, genre) rows of track_genres.csv like write_tracks
+
+    Categorical columns are stored dictionary encoded.
+    """
+    require_pyarrow()
+    return _write_table(pa.Table.from_pandas(genres_df, preserve_index=False), path)
+
+
+def _write_table(table: "pa.Table", path: str) -> str:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if path.endswith(FORMATS["arrow"]):
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        pq.write_table(table, path, compression="zstd")
+    return path
+
+
+def read_tracks(path: str, columns: Optional[List[str]] = None) -> "pa.Table":
+    """
+    Load a file written by write_tracks, optionally only some columns
+
+    Arrow files are memory-mapped, so selected columns are read zero-copy.
+    """
+    require_pyarrow()
+    if path.endswith(FORMATS["arrow"]):
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        return table.select(columns) if columns else table
+    # Keep dictionary-encoded columns as dictionaries instead of decoding them
+    return pq.read_table(path, columns=columns, memory_map=True)
+
+
+def genre_pairs(path: str) -> pd.DataFrame:
+    """
+    One row per (track, genre) from a columnar file, like track_genres.csv
+
+    The genres list column is flattened in Arrow, and the string columns
+    come out as pandas categoricals.
+    """
+    table = read_tracks(path, ["track_name", "artist_name", "genres"])
+    genres = table["genres"].combine_chunks()
+    rows = pc.list_parent_indices(genres)
+    pairs = pa.table(
+        {
+            "track_name": table["track_name"].take(rows),
+            "artist_name": table["artist_name"].take(rows),
+            "genre": pc.list_flatten(genres).dictionary_encode(),
+        }
+    )
+    return pairs.to_pandas().astype(
+        {"track_name": "category", "artist_name": "category", "genre": "category"}
+    )
@@ -1,132 +1,192 @@
 import json
-from collections import defaultdict
+import sys
+from json.encoder import encode_basestring
+from typing import Iterable, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
-
-def transform_genres():
-    """Transform the genre CSV into a flattened JSON structure"""
-    # Read the CSV file
-    df = pd.read_csv("track_genres.csv")
-
-    # Create a dictionary to store tracks and their genres
-    tracks_dict = defaultdict(
-        lambda: {
-            "artist_name": "",
-            "genres": set(),  # Using a set to avoid duplicate genres
-        }
+from columnar import FORMATS, genre_pairs
+from genre_index import GenreIndex
+
+
+def _encode(value, indent: str) -> str:
+    """
+    Encode dicts, lists and strings like json.dumps(indent=2, ensure_ascii=False)
+
+    json.dumps falls back to its pure Python encoder whenever indent is set;
+    this only handles the shapes written here but keeps strings on the C
+    fast path.
+    """
+    if isinstance(value, str):
+        return encode_basestring(value)
+    inner = indent + "  "
+    if isinstance(value, dict):
+        if not value:
+            return "{}"
+        members = ",\n".join(
+            f"{inner}{encode_basestring(key)}: {_encode(item, inner)}"
+            for key, item in value.items()
+        )
+        return "{\n" + members + "\n" + indent + "}"
+    if isinstance(value, list):
+        if not value:
+            return "[]"
+        members = ",\n".join(inner + _encode(item, inner) for item in value)
+        return "[\n" + members + "\n" + indent + "]"
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _write_json_object(f, items: Iterable[Tuple[str, object]], level: int) -> None:
+    """
+    Stream a JSON object one member at a time
+
+    Produces the same text as json.dump(..., indent=2, ensure_ascii=False)
+    for an object nested `level` levels deep, without building it in memory.
+    """
+    indent = "  " * (level + 1)
+    f.write("{")
+    first = True
+    for key, value in items:
+        f.write("\n" if first else ",\n")
+        first = False
+        f.write(f"{indent}{encode_basestring(key)}: {_encode(value, indent)}")
+    f.write("}" if first else "\n" + "  " * level + "}")
+
+
+def transform_genres(source: str = "track_genres.csv"):
+    """
+    Transform the genre CSV into a flattened JSON structure
+
+    source can also be a track_details.parquet/.arrow file written with
+    --columnar, whose genres list column is read directly instead of the CSV.
+    """
+    if source.endswith(tuple(FORMATS.values())):
+        df = genre_pairs(source)
+    else:
+        # Read the CSV file, repeated names and genres are stored once as categories
+        df = pd.read_csv(
+            source,
+            usecols=["track_name", "artist_name", "genre"],
+            dtype={"track_name": "category", "artist_name": "category", "genre": "category"},
+        )
+    df = df.dropna(subset=["track_name", "genre"])
+
+    # Tracks keep the order they first appear in; the last artist seen wins
+    track_order = df["track_name"].drop_duplicates()
+    artists = df.groupby("track_name", observed=True, sort=False)["artist_name"].last()
+
+    # Unique (track, genre) pairs sorted by track appearance then genre name
+    pairs = df[["track_name", "genre"]].drop_duplicates()
+    pairs = pairs.assign(
+        track_rank=pairs["track_name"].map(
+            pd.Series(range(len(track_order)), index=track_order.values)
+        ).astype("int64"),
+        genre_str=pairs["genre"].astype(str),
+    ).sort_values(["track_rank", "genre_str"], kind="stable")
+
+    # Pairs are sorted by track, so each track's genres are one contiguous slice
+    ranks = pairs["track_rank"].to_numpy()
+    genre_values = pairs["genre_str"].to_numpy()
+    bounds = np.append(np.searchsorted(ranks, np.arange(len(track_order))), len(ranks))
+
+    # Genre index: genres in order of first use, tracks sorted by name
+    pairs["artist_name"] = pairs["track_name"].map(artists).astype(str)
+    pairs["track_str"] = pairs["track_name"].astype(str)
+    genre_order = pairs["genre_str"].drop_duplicates()
+    by_genre = pairs.sort_values("track_str", kind="stable").groupby(
+        "genre_str", sort=False
     )
 
-    # Process each row
-    for _, row in df.iterrows():
-        track_name = row["track_name"]
-        tracks_dict[track_name]["artist_name"] = row["artist_name"]
-        tracks_dict[track_name]["genres"].add(row["genre"])
-
-    # Convert sets to lists for JSON serialization
-    output_dict = {
-        track_name: {
-            "artist_name": info["artist_name"],
-            "genres": sorted(list(info["genres"])),  # Sort genres for consistency
-        }
-        for track_name, info in tracks_dict.items()
-    }
-
-    # Create a genre index for quick lookups
-    genre_index = defaultdict(list)
-    for track_name, info in output_dict.items():
-        for genre in info["genres"]:
-            genre_index[genre].append(
-                {"track_name": track_name, "artist_name": info["artist_name"]}
-            )
-
-    # Create the final structure
-    final_output = {
-        "tracks": output_dict,
-        "genres": {
-            genre: sorted(tracks, key=lambda x: x["track_name"])
-            for genre, tracks in genre_index.items()
-        },
-    }
-
-    # Save to JSON file
+    track_artists = artists.reindex(track_order.values).astype(str).tolist()
+
+    def track_items():
+        for rank, track_name in enumerate(track_order.astype(str)):
+            yield track_name, {
+                "artist_name": track_artists[rank],
+                "genres": genre_values[bounds[rank] : bounds[rank + 1]].tolist(),
+            }
+
+    def genre_items():
+        for genre in genre_order:
+            group = by_genre.get_group(genre)
+            yield genre, [
+                {"track_name": track_name, "artist_name": artist_name}
+                for track_name, artist_name in zip(
+                    group["track_str"], group["artist_name"]
+                )
+            ]
+
+    # Save to JSON file, streaming one track/genre at a time
     with open("tracks_by_genre.json", "w", encoding="utf-8") as f:
-        json.dump(final_output, f, indent=2, ensure_ascii=False)
+        f.write('{\n  "tracks": ')
+        _write_json_object(f, track_items(), level=1)
+        f.write(',\n  "genres": ')
+        _write_json_object(f, genre_items(), level=1)
+        f.write("\n}")
 
     # Print some stats
-    print(f"Processed {len(output_dict)} unique tracks")
-    print(f"Found {len(genre_index)} unique genres")
+    print(f"Processed {len(track_order)} unique tracks")
+    print(f"Found {len(genre_order)} unique genres")
 
     # Print example of how to use the JSON
     print("\nExample of tracks by genre:")
     genre_example = "progressive house"
-    if genre_example in final_output["genres"]:
+    if genre_example in set(genre_order):
         print(f"\nTracks with genre '{genre_example}':")
-        for track in final_output["genres"][genre_example]:
-            print(f"- {track['track_name']} by {track['artist_name']}")
+        group = by_genre.get_group(genre_example)
+        for track_name, artist_name in zip(group["track_str"], group["artist_name"]):
+            print(f"- {track_name} by {artist_name}")
 
 
-def find_tracks_by_genre(genre):
-    """Helper function to find tracks by genre from the JSON file"""
+def _load_index() -> Optional[GenreIndex]:
+    """Load the query index once, it is reused by every helper below"""
     try:
-        with open("tracks_by_genre.json", "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        if genre in data["genres"]:
-            return data["genres"][genre]
-        return []
+        return GenreIndex.load("tracks_by_genre.json")
     except FileNotFoundError:
         print(
             "Please run the transform_genres() function first to create the JSON file"
         )
-        return []
+        return None
+
+
+def find_tracks_by_genre(genre):
+    """Helper function to find tracks by genre from the JSON file"""
+    index = _load_index()
+    return index.tracks_by_genre(genre) if index else []
 
 
 def find_tracks_without_genre_keyword(keyword):
     """Find all tracks that don't have any genres containing the given keyword"""
-    try:
-        with open("tracks_by_genre.json", "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        non_melodic_tracks = []
-        for track_name, info in data["tracks"].items():
-            # Check if none of the track's genres contain the keyword
-            if not any(keyword.lower() in genre.lower() for genre in info["genres"]):
-                non_melodic_tracks.append(
-                    {
-                        "track_name": track_name,
-                        "artist_name": info["artist_name"],
-                        "genres": info["genres"],
-                    }
-                )
+    index = _load_index()
+    return index.tracks_without_genre_keyword(keyword) if index else []
+
+
+def find_tracks_with_genre_keyword(keyword):
+    """Find all tracks that have a genre containing the given keyword"""
+    index = _load_index()
+    return index.tracks_with_genre_keyword(keyword) if index else []
 
-        return sorted(non_melodic_tracks, key=lambda x: x["track_name"])
-    except FileNotFoundError:
-        print(
-            "Please run the transform_genres() function first to create the JSON file"
-        )
-        return []
+
+def find_tracks_matching(expression):
+    """
+    Find tracks matching a genre filter expression
+
+    e.g. "progressive house AND NOT melodic" or "(techno OR trance) AND NOT kw:minimal"
+    """
+    index = _load_index()
+    return index.select(expression) if index else []
 
 
 def find_track_info(track_name):
     """Helper function to get all genres for a specific track"""
-    try:
-        with open("tracks_by_genre.json", "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        if track_name in data["tracks"]:
-            return data["tracks"][track_name]
-        return None
-    except FileNotFoundError:
-        print(
-            "Please run the transform_genres() function first to create the JSON file"
-        )
-        return None
+    index = _load_index()
+    return index.track_info(track_name) if index else None
 
 
 if __name__ == "__main__":
-    # Transform the data
-    transform_genres()
+    # Transform the data, from track_genres.csv or the file given
+    transform_genres(sys.argv[1] if len(sys.argv) > 1 else "track_genres.csv")
 
     # Example usage
     print("\nExample searches:")
@@ -153,3 +213,11 @@ if __name__ == "__main__":
         for track in non_melodic_tracks:
             print(f"- {track['track_name']} by {track['artist_name']}")
             print(f"  Genres: {', '.join(track['genres'])}")
+
+    # Combine genres and keywords in one filter
+    expression = "progressive house AND NOT melodic"
+    filtered_tracks = find_tracks_matching(expression)
+    if filtered_tracks:
+        print(f"\nTracks matching '{expression}':")
+        for track in filtered_tracks:
+            print(f"- {track['track_name']} by {track['artist_name']}")
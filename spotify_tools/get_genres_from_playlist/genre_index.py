@@ -0,0 +1,221 @@
+import json
+import os
+import re
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Quoted phrases, parentheses, or runs of anything else
+_TOKEN_PATTERN = re.compile(r'(?:\w+:)?"[^"]*"|\(|\)|[^\s()"]+')
+_OPERATORS = {"AND", "OR", "NOT"}
+
+# Loaded indexes keyed by path, reused until the file's mtime changes
+_loaded: Dict[str, Tuple[float, "GenreIndex"]] = {}
+
+
+class GenreIndex:
+    def __init__(self, data: Dict):
+        """
+        In-memory query index over the tracks_by_genre.json structure
+
+        Tracks are numbered in track name order so every result list comes
+        out already sorted. Keyword queries are answered against the genre
+        vocabulary (a few thousand names) rather than every track, then
+        expanded through per-genre posting lists.
+        """
+        self.track_names = sorted(data["tracks"])
+        self.positions = {name: i for i, name in enumerate(self.track_names)}
+        self.artists = [data["tracks"][name]["artist_name"] for name in self.track_names]
+        self.track_genres = [data["tracks"][name]["genres"] for name in self.track_names]
+
+        self.genres = sorted(data["genres"])
+        self.genre_ids = {genre: i for i, genre in enumerate(self.genres)}
+        self.genre_lower = [genre.lower() for genre in self.genres]
+        self.genre_tracks: List[np.ndarray] = [
+            np.sort(
+                np.fromiter(
+                    (self.positions[track["track_name"]] for track in data["genres"][genre]),
+                    dtype=np.int64,
+                )
+            )
+            for genre in self.genres
+        ]
+
+        # Trigram index over genre names narrows substring searches
+        self.trigrams = defaultdict(set)
+        for genre_id, genre in enumerate(self.genre_lower):
+            for i in range(len(genre) - 2):
+                self.trigrams[genre[i : i + 3]].add(genre_id)
+
+        self.matching_genres = lru_cache(maxsize=4096)(self._matching_genres)
+        self.tracks_with_keyword = lru_cache(maxsize=1024)(self._tracks_with_keyword)
+        self.genre_bitmap = lru_cache(maxsize=4096)(self._genre_bitmap)
+        self.keyword_bitmap = lru_cache(maxsize=1024)(self._keyword_bitmap)
+
+    @classmethod
+    def load(cls, path: str = "tracks_by_genre.json") -> "GenreIndex":
+        """Load an index once per process, reloading only if the file changed"""
+        mtime = os.path.getmtime(path)
+        cached = _loaded.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, "r", encoding="utf-8") as f:
+            index = cls(json.load(f))
+        _loaded[path] = (mtime, index)
+        return index
+
+    def _matching_genres(self, keyword: str) -> Tuple[int, ...]:
+        """IDs of genres containing keyword, case-insensitively"""
+        keyword = keyword.lower()
+        if len(keyword) < 3:
+            candidates = range(len(self.genres))
+        else:
+            # Every trigram of the keyword must occur in a matching genre
+            grams = sorted(
+                (self.trigrams.get(keyword[i : i + 3], set()) for i in range(len(keyword) - 2)),
+                key=len,
+            )
+            candidates = set.intersection(*grams) if grams[0] else set()
+        return tuple(
+            sorted(genre_id for genre_id in candidates if keyword in self.genre_lower[genre_id])
+        )
+
+    def _tracks_with_keyword(self, keyword: str) -> Tuple[int, ...]:
+        return tuple(np.flatnonzero(self.keyword_bitmap(keyword)).tolist())
+
+    def tracks_without_keyword(self, keyword: str) -> List[int]:
+        return np.flatnonzero(~self.keyword_bitmap(keyword)).tolist()
+
+    def _track(self, position: int, with_genres: bool = False) -> Dict:
+        track = {
+            "track_name": self.track_names[position],
+            "artist_name": self.artists[position],
+        }
+        if with_genres:
+            track["genres"] = list(self.track_genres[position])
+        return track
+
+    def tracks_by_genre(self, genre: str) -> List[Dict]:
+        """Tracks tagged with exactly this genre, sorted by track name"""
+        genre_id = self.genre_ids.get(genre)
+        if genre_id is None:
+            return []
+        return [self._track(i) for i in self.genre_tracks[genre_id].tolist()]
+
+    def tracks_with_genre_keyword(self, keyword: str) -> List[Dict]:
+        """Tracks having at least one genre containing keyword"""
+        return [self._track(i, True) for i in self.tracks_with_keyword(keyword)]
+
+    def tracks_without_genre_keyword(self, keyword: str) -> List[Dict]:
+        """Tracks with no genre containing keyword"""
+        return [self._track(i, True) for i in self.tracks_without_keyword(keyword)]
+
+    def track_info(self, track_name: str) -> Optional[Dict]:
+        position = self.positions.get(track_name)
+        if position is None:
+            return None
+        return {
+            "artist_name": self.artists[position],
+            "genres": list(self.track_genres[position]),
+        }
+
+    def _bitmap(self, genre_ids: Iterable[int]) -> np.ndarray:
+        bitmap = np.zeros(len(self.track_names), dtype=bool)
+        for genre_id in genre_ids:
+            bitmap[self.genre_tracks[genre_id]] = True
+        bitmap.flags.writeable = False
+        return bitmap
+
+    def _genre_bitmap(self, genre: str) -> np.ndarray:
+        """Tracks tagged with exactly this genre, as a bool array over track IDs"""
+        genre_id = self.genre_ids.get(genre)
+        return self._bitmap([genre_id] if genre_id is not None else [])
+
+    def _keyword_bitmap(self, keyword: str) -> np.ndarray:
+        """Tracks having a genre containing keyword, as a bool array over track IDs"""
+        return self._bitmap(self.matching_genres(keyword))
+
+    def term_bitmap(self, term: str) -> np.ndarray:
+        """
+        Bitmap for one operand of a filter expression
+
+        'genre:x' matches the exact genre, 'kw:x' any genre containing x;
+        a bare term is an exact genre when one exists, otherwise a keyword.
+        """
+        kind, _, value = term.partition(":")
+        if value and kind in ("genre", "kw"):
+            value = value.strip('"')
+            return self.genre_bitmap(value) if kind == "genre" else self.keyword_bitmap(value)
+        term = term.strip('"')
+        if term in self.genre_ids:
+            return self.genre_bitmap(term)
+        return self.keyword_bitmap(term)
+
+    def evaluate(self, expression: str) -> np.ndarray:
+        """
+        Evaluate a filter such as 'progressive house AND NOT melodic'
+
+        Supports AND, OR, NOT (binding tightest) and parentheses. Operands
+        are genre names or keywords (see term_bitmap); consecutive words
+        form one operand and phrases can also be double quoted.
+        """
+        tokens = _TOKEN_PATTERN.findall(expression)
+        position = 0
+
+        def peek() -> Optional[str]:
+            return tokens[position] if position < len(tokens) else None
+
+        def take() -> Optional[str]:
+            nonlocal position
+            token = peek()
+            position += 1
+            return token
+
+        def parse_or() -> np.ndarray:
+            result = parse_and()
+            while peek() == "OR":
+                take()
+                result = result | parse_and()
+            return result
+
+        def parse_and() -> np.ndarray:
+            result = parse_not()
+            while peek() == "AND":
+                take()
+                result = result & parse_not()
+            return result
+
+        def parse_not() -> np.ndarray:
+            if peek() == "NOT":
+                take()
+                return ~parse_not()
+            if peek() == "(":
+                take()
+                result = parse_or()
+                if take() != ")":
+                    raise ValueError(f"Unbalanced parentheses in: {expression}")
+                return result
+            words = []
+            while peek() is not None and peek() not in _OPERATORS | {"(", ")"}:
+                words.append(take())
+            if not words:
+                raise ValueError(f"Expected a genre or keyword in: {expression}")
+            return self.term_bitmap(" ".join(words))
+
+        result = parse_or()
+        if peek() is not None:
+            raise ValueError(f"Unexpected {peek()!r} in: {expression}")
+        return result
+
+    def select(self, expression: str) -> List[Dict]:
+        """Tracks matching a filter expression, sorted by track name"""
+        return [
+            self._track(i, True) for i in np.flatnonzero(self.evaluate(expression)).tolist()
+        ]
+
+    def batch(self, keywords: Iterable[str], negate: bool = False) -> Dict[str, List[Dict]]:
+        """Run several keyword (or negated keyword) queries in one call"""
+        query = self.tracks_without_genre_keyword if negate else self.tracks_with_genre_keyword
+        return {keyword: query(keyword) for keyword in keywords}
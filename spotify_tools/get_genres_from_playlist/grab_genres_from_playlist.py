@@ -1,13 +1,23 @@
+import argparse
 import logging
 import os
-from time import sleep
-from typing import Dict, List
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import pandas as pd
 import spotipy
 from dotenv import load_dotenv
 from spotipy.oauth2 import SpotifyOAuth
 
+# Shared spotify_tools modules live one directory up
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from artist_cache import ARTIST_BATCH_SIZE, ArtistCache, default_cache, fetch_artists  # noqa: E402
+from columnar import FORMATS, write_genres, write_tracks  # noqa: E402
+from playlist_pager import get_all_playlist_items, iter_playlist_pages  # noqa: E402
+from rate_limit import default_scheduler, spotify_client  # noqa: E402
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -19,8 +29,8 @@ def setup_spotify():
     """Initialize Spotify client with necessary permissions"""
     scope = "playlist-read-private"  # Simplified scope
     try:
-        return spotipy.Spotify(
-            auth_manager=SpotifyOAuth(
+        return spotify_client(
+            SpotifyOAuth(
                 client_id=os.getenv("SPOTIFY_CLIENT_ID"),
                 client_secret=os.getenv("SPOTIFY_CLIENT_SECRET"),
                 redirect_uri=os.getenv("SPOTIFY_REDIRECT_URI"),
@@ -33,16 +43,9 @@ def setup_spotify():
 
 
 def get_playlist_tracks(sp: spotipy.Spotify, playlist_id: str) -> List[Dict]:
-    """Get all tracks from a playlist"""
-    tracks = []
+    """Get all tracks from a playlist, fetching pages concurrently"""
     try:
-        results = sp.playlist_items(playlist_id)
-        tracks.extend(results["items"])
-
-        while results["next"]:
-            results = sp.next(results)
-            tracks.extend(results["items"])
-
+        tracks = get_all_playlist_items(sp, playlist_id)
         logger.info(f"Retrieved {len(tracks)} tracks from playlist")
         return tracks
     except Exception as e:
@@ -50,30 +53,32 @@ def get_playlist_tracks(sp: spotipy.Spotify, playlist_id: str) -> List[Dict]:
         raise
 
 
-def get_artist_genres(sp: spotipy.Spotify, artist_id: str) -> List[str]:
-    """Get genres for an artist with rate limiting"""
-    try:
-        artist_info = sp.artist(artist_id)
-        sleep(0.25)  # Add a small delay to avoid rate limiting
-        return artist_info.get("genres", [])
-    except Exception as e:
-        logger.error(f"Error getting artist genres: {str(e)}")
-        return []
+def get_artists_genres(
+    sp: spotipy.Spotify, artist_ids: Iterable[str], cache: ArtistCache
+) -> Dict[str, List[str]]:
+    """Get genres for many artists from the cache, fetching misses 50 per request"""
+    artists = fetch_artists(sp, artist_ids, cache)
+    return {artist_id: artist["genres"] for artist_id, artist in artists.items()}
+
+
+def get_artist_genres(
+    sp: spotipy.Spotify, artist_id: str, cache: Optional[ArtistCache] = None
+) -> List[str]:
+    """Get genres for a single artist"""
+    cache = cache or default_cache()
+    return get_artists_genres(sp, [artist_id], cache).get(artist_id, [])
 
 
-def get_track_details(sp: spotipy.Spotify, track: Dict) -> Dict:
-    """Get genre information about a track"""
+def get_track_details(track: Dict, artist_genres: Dict[str, List[str]]) -> Dict:
+    """Get genre information about a track from already resolved artist genres"""
     try:
         track_data = track["track"]
         artist_id = track_data["artists"][0]["id"]
 
-        # Get artist genres
-        genres = get_artist_genres(sp, artist_id)
-
         return {
             "track_name": track_data["name"],
             "artist_name": track_data["artists"][0]["name"],
-            "genres": genres,
+            "genres": artist_genres.get(artist_id, []),
             "artist_id": artist_id,
             "track_id": track_data["id"],
             "popularity": track_data.get("popularity", 0),
@@ -87,7 +92,215 @@ def get_track_details(sp: spotipy.Spotify, track: Dict) -> Dict:
         return None
 
 
-def analyze_playlist(playlist_id: str):
+def stream_track_details(
+    sp: spotipy.Spotify, playlist_id: str, cache: ArtistCache
+) -> List[Dict]:
+    """
+    Fetch a playlist's tracks and their artist genres as one pipeline
+
+    Pages are requested concurrently; as each one arrives its new artists
+    are queued and resolved in full batches of 50 while later pages are
+    still in flight.
+    """
+    tracks = []
+    artist_genres = {}
+    queued = set()
+    pending = []
+
+    for page in iter_playlist_pages(sp, playlist_id):
+        for track in page:
+            # Skip any invalid tracks
+            if not track["track"]:
+                continue
+            tracks.append(track)
+            artists = track["track"].get("artists")
+            artist_id = artists[0]["id"] if artists else None
+            if artist_id and artist_id not in queued:
+                queued.add(artist_id)
+                pending.append(artist_id)
+
+        full = len(pending) - len(pending) % ARTIST_BATCH_SIZE
+        if full:
+            artist_genres.update(get_artists_genres(sp, pending[:full], cache))
+            pending = pending[full:]
+
+    artist_genres.update(get_artists_genres(sp, pending, cache))
+    logger.info(f"Retrieved {len(tracks)} tracks from playlist. {cache.stats()}")
+
+    # Get detailed information for each track
+    track_details = []
+    for track in tracks:
+        details = get_track_details(track, artist_genres)
+        if details:
+            track_details.append(details)
+    return track_details
+
+
+def build_genres_df(df: pd.DataFrame) -> pd.DataFrame:
+    """One row per (track, genre), with categorical artist and genre columns"""
+    if df.empty:
+        return pd.DataFrame(columns=["track_name", "artist_name", "genre"])
+
+    genres_df = (
+        df[["track_name", "artist_name", "genres"]]
+        .explode("genres")
+        .dropna(subset=["genres"])
+        .rename(columns={"genres": "genre"})
+        .reset_index(drop=True)
+    )
+    return genres_df.astype({"artist_name": "category", "genre": "category"})
+
+
+def export_track_details(
+    track_details: List[Dict], directory: str = ".", columnar: Optional[str] = None
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Write track_details and track_genres, returning both DataFrames
+
+    CSV files are always written. With columnar set to 'parquet' or 'arrow'
+    track_details and track_genres .parquet/.arrow files are written next to
+    them as well; the details' genres column is a real list (requires pyarrow).
+    """
+    # Convert to DataFrame
+    df = pd.DataFrame(track_details)
+
+    # Create a separate genres DataFrame
+    genres_df = build_genres_df(df)
+
+    # Export to CSV files
+    os.makedirs(directory, exist_ok=True)
+    details_path = os.path.join(directory, "track_details.csv")
+    df.to_csv(details_path, index=False)
+    if not genres_df.empty:
+        genres_df.to_csv(os.path.join(directory, "track_genres.csv"), index=False)
+
+    if columnar:
+        write_tracks(
+            track_details, os.path.join(directory, "track_details" + FORMATS[columnar])
+        )
+        if not genres_df.empty:
+            write_genres(genres_df, os.path.join(directory, "track_genres" + FORMATS[columnar]))
+
+    logger.info(f"Exported track details to {details_path}")
+    return df, genres_df
+
+
+def log_genre_summary(df: pd.DataFrame, genres_df: pd.DataFrame) -> None:
+    """Log track counts per genre and the tracks that have no genres"""
+    if genres_df.empty:
+        logger.info("No genre information found in the playlist")
+        return
+
+    genre_counts = genres_df["genre"].value_counts()
+    genre_counts = genre_counts[genre_counts > 0]
+    lines = genre_counts.index.astype(str) + ": " + genre_counts.astype(str) + " tracks"
+    logger.info("\nGenre Summary:\n" + "\n".join(lines))
+
+    # Print tracks without genres
+    without_genres = df[df["genres"].str.len() == 0]
+    if not without_genres.empty:
+        lines = "- " + without_genres["track_name"] + " by " + without_genres["artist_name"]
+        logger.info("\nTracks without genre information:\n" + "\n".join(lines))
+
+
+def fetch_playlist_items(sp: spotipy.Spotify, playlist_id: str) -> List[Dict]:
+    """Fetch the valid track items of one playlist"""
+    try:
+        items = get_all_playlist_items(sp, playlist_id, max_workers=2)
+    except Exception as e:
+        logger.error(f"Error fetching playlist {playlist_id}: {str(e)}")
+        return []
+    return [item for item in items if item["track"]]
+
+
+def analyze_playlists(
+    playlist_ids: List[str],
+    output_dir: str = "output",
+    max_workers: int = 4,
+    columnar: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Analyze many playlists, resolving each unique artist only once
+
+    All playlists are fetched on a worker pool first, artists are then
+    deduplicated across every playlist and resolved in one batched pass.
+    Per-playlist CSVs go to output_dir/<playlist_id>/ and one combined
+    dataset with a row per unique track (and the playlists it appears in)
+    is written to output_dir/all_tracks.parquet (.arrow with columnar='arrow'),
+    or .csv without pyarrow.
+    """
+    sp = setup_spotify()
+    playlist_ids = list(dict.fromkeys(playlist_ids))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        playlists = dict(
+            zip(
+                playlist_ids,
+                executor.map(lambda pid: fetch_playlist_items(sp, pid), playlist_ids),
+            )
+        )
+
+    # Deduplicate tracks and artists across every playlist before resolving
+    unique_tracks = {}
+    memberships = {}
+    for playlist_id, items in playlists.items():
+        for item in items:
+            track_id = item["track"].get("id") or item["track"].get("uri")
+            unique_tracks.setdefault(track_id, item)
+            memberships.setdefault(track_id, []).append(playlist_id)
+    artist_ids = {
+        item["track"]["artists"][0]["id"]
+        for item in unique_tracks.values()
+        if item["track"].get("artists")
+    }
+    total_items = sum(len(items) for items in playlists.values())
+    logger.info(
+        f"Fetched {total_items} tracks from {len(playlists)} playlists: "
+        f"{len(unique_tracks)} unique tracks by {len(artist_ids)} unique artists"
+    )
+
+    cache = default_cache()
+    artist_genres = get_artists_genres(sp, artist_ids, cache)
+    logger.info(cache.stats())
+
+    details = {}
+    for track_id, item in unique_tracks.items():
+        track_details = get_track_details(item, artist_genres)
+        if track_details:
+            details[track_id] = track_details
+
+    # Per-playlist outputs
+    for playlist_id, items in playlists.items():
+        playlist_details = []
+        for item in items:
+            track_id = item["track"].get("id") or item["track"].get("uri")
+            if track_id in details:
+                playlist_details.append(details[track_id])
+        if playlist_details:
+            export_track_details(
+                playlist_details, os.path.join(output_dir, playlist_id), columnar
+            )
+
+    # Combined dataset, one row per unique track
+    combined_details = [
+        dict(track_details, playlists=memberships[track_id])
+        for track_id, track_details in details.items()
+    ]
+    combined = pd.DataFrame(combined_details)
+    os.makedirs(output_dir, exist_ok=True)
+    try:
+        combined_path = os.path.join(output_dir, "all_tracks" + FORMATS[columnar or "parquet"])
+        write_tracks(combined_details, combined_path)
+    except ImportError:
+        logger.warning("pyarrow not installed, writing the combined dataset as CSV")
+        combined_path = os.path.join(output_dir, "all_tracks.csv")
+        combined.to_csv(combined_path, index=False)
+    logger.info(f"Exported {len(combined)} unique tracks to {combined_path}")
+
+    return combined
+
+
+def analyze_playlist(playlist_id: str, columnar: Optional[str] = None):
     """Analyze all tracks in a playlist and export genre information"""
     try:
         sp = setup_spotify()
@@ -97,76 +310,91 @@ def analyze_playlist(playlist_id: str):
         playlist_name = playlist_info["name"]
         logger.info(f"Analyzing playlist: {playlist_name}")
 
-        # Get all tracks from playlist
-        tracks = get_playlist_tracks(sp, playlist_id)
-
-        # Get detailed information for each track
-        track_details = []
-        for track in tracks:
-            if not track["track"]:  # Skip any invalid tracks
-                continue
-
-            logger.info(f"Processing track: {track['track']['name']}")
-            details = get_track_details(sp, track)
-            if details:
-                track_details.append(details)
-
-        # Convert to DataFrame
-        df = pd.DataFrame(track_details)
-
-        # Create a separate genres DataFrame
-        genres_data = []
-        for _, row in df.iterrows():
-            for genre in row["genres"]:
-                genres_data.append(
-                    {
-                        "track_name": row["track_name"],
-                        "artist_name": row["artist_name"],
-                        "genre": genre,
-                    }
-                )
-
-        genres_df = pd.DataFrame(genres_data)
-
-        # Export to CSV files
-        df.to_csv("track_details.csv", index=False)
-        if not genres_df.empty:
-            genres_df.to_csv("track_genres.csv", index=False)
+        # Get all tracks from playlist, resolving artists as pages arrive
+        track_details = stream_track_details(sp, playlist_id, default_cache())
 
-        logger.info(f"Exported track details to track_details.csv")
+        df, genres_df = export_track_details(track_details, columnar=columnar)
 
         # Print genre summary
-        if not genres_df.empty:
-            genre_counts = genres_df["genre"].value_counts()
-            logger.info("\nGenre Summary:")
-            for genre, count in genre_counts.items():
-                logger.info(f"{genre}: {count} tracks")
-
-            # Print tracks without genres
-            tracks_without_genres = df[df["genres"].apply(len) == 0]
-            if not tracks_without_genres.empty:
-                logger.info("\nTracks without genre information:")
-                for _, row in tracks_without_genres.iterrows():
-                    logger.info(f"- {row['track_name']} by {row['artist_name']}")
-        else:
-            logger.info("No genre information found in the playlist")
+        log_genre_summary(df, genres_df)
 
     except Exception as e:
         logger.error(f"Failed to analyze playlist: {str(e)}")
 
 
+def clean_playlist_id(playlist_id: str) -> str:
+    """Remove any quotes and query parameters, accepting playlist URLs too"""
+    playlist_id = playlist_id.strip().strip("\"'").split("?")[0]
+    return playlist_id.rstrip("/").split("/")[-1]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Export genre information for Spotify playlists"
+    )
+    parser.add_argument(
+        "--playlists",
+        nargs="+",
+        help="Analyze several playlist IDs/URLs in one batch",
+    )
+    parser.add_argument(
+        "--playlist-file",
+        help="Text file with one playlist ID/URL per line, analyzed in one batch",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="output",
+        help="Directory for batch outputs (default: output)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Playlists fetched concurrently in batch mode (default: 4)",
+    )
+    parser.add_argument(
+        "--columnar",
+        choices=list(FORMATS),
+        help="Also write track details as Parquet or Arrow IPC with a list genres "
+        "column (requires pyarrow)",
+    )
+    parser.add_argument(
+        "--parquet",
+        dest="columnar",
+        action="store_const",
+        const="parquet",
+        help="Shorthand for --columnar parquet",
+    )
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
     load_dotenv()
 
+    batch = list(args.playlists or [])
+    if args.playlist_file:
+        with open(args.playlist_file, "r", encoding="utf-8") as f:
+            batch.extend(line for line in f if line.strip())
+    if batch:
+        analyze_playlists(
+            [clean_playlist_id(playlist_id) for playlist_id in batch],
+            args.output_dir,
+            args.workers,
+            args.columnar,
+        )
+        logger.info(default_scheduler().stats())
+        return
+
     playlist_id = os.getenv("SPOTIFY_PLAYLIST_ID")
     if not playlist_id:
         logger.error("SPOTIFY_PLAYLIST_ID not found in environment variables")
         return
 
-    # Remove any quotes and query parameters
-    playlist_id = playlist_id.strip("\"'").split("?")[0]
+    playlist_id = clean_playlist_id(playlist_id)
 
-    analyze_playlist(playlist_id)
+    analyze_playlist(playlist_id, args.columnar)
+    logger.info(default_scheduler().stats())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,53 @@
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# Maximum page size of the playlist items endpoint
+PAGE_SIZE = 100
+
+
+def iter_playlist_pages(
+    sp, playlist_id: str, max_workers: int = 4, page_size: int = PAGE_SIZE
+) -> Iterator[List[Dict]]:
+    """
+    Yield the items of a playlist page by page, in playlist order
+
+    The first page reports the total, so the remaining offsets are known up
+    front and fetched concurrently instead of following results["next"].
+    Pages are yielded as soon as they and every page before them have
+    arrived, so callers can start working while later pages are in flight.
+    """
+    first = sp.playlist_items(playlist_id, limit=page_size, offset=0)
+    yield first["items"]
+
+    offsets = range(page_size, first["total"], page_size)
+    if not offsets:
+        return
+
+    def fetch(offset: int) -> List[Dict]:
+        return sp.playlist_items(playlist_id, limit=page_size, offset=offset)["items"]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        offsets = iter(offsets)
+        # Keep a bounded number of pages in flight
+        for offset in offsets:
+            pending.append(executor.submit(fetch, offset))
+            if len(pending) >= max_workers * 2:
+                break
+        while pending:
+            yield pending.popleft().result()
+            for offset in offsets:
+                pending.append(executor.submit(fetch, offset))
+                break
+
+
+def get_all_playlist_items(sp, playlist_id: str, max_workers: int = 4) -> List[Dict]:
+    """Fetch every item of a playlist with concurrent page requests"""
+    items = []
+    for page in iter_playlist_pages(sp, playlist_id, max_workers):
+        items.extend(page)
+    return items
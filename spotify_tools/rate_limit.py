@@ -0,0 +1,281 @@
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import requests
+import spotipy
+from spotipy.exceptions import SpotifyException
+
+logger = logging.getLogger(__name__)
+
+READ = "read"
+WRITE = "write"
+
+# spotipy methods that modify playlists or the library
+WRITE_PREFIXES = (
+    "playlist_add",
+    "playlist_remove",
+    "playlist_replace",
+    "playlist_reorder",
+    "playlist_change",
+    "playlist_upload",
+    "user_playlist_create",
+    "user_playlist_change",
+    "current_user_saved_",
+    "current_user_follow",
+    "current_user_unfollow",
+    "user_follow",
+    "user_unfollow",
+)
+# Reads whose names would otherwise match a write prefix
+READ_METHODS = {
+    "current_user_saved_tracks",
+    "current_user_saved_albums",
+    "current_user_saved_shows",
+}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# A failed read can simply be sent again
+RETRY_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+
+def lane_for(method_name: str) -> str:
+    if method_name not in READ_METHODS and method_name.startswith(WRITE_PREFIXES):
+        return WRITE
+    return READ
+
+
+class RequestScheduler:
+    def __init__(
+        self,
+        rate: float = 10.0,
+        burst: int = 10,
+        min_rate: float = 1.0,
+        max_rate: float = 50.0,
+        increase: float = 0.2,
+        max_retries: int = 5,
+        base_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+    ):
+        """
+        Token bucket shared by every request to the Spotify API
+
+        The rate adapts to what the API reports: each success raises it by
+        increase requests/second up to max_rate, and a 429 halves it and
+        pauses every lane until the response's Retry-After has passed. Write
+        requests take the next free token before any waiting read.
+
+        Args:
+            rate: Starting requests per second
+            burst: Tokens that can accumulate while idle
+            min_rate, max_rate: Bounds for the adapted rate
+            increase: Requests per second added after each success
+            max_retries: Retries for 429s, and for reads also for 5xx,
+                connection errors and timeouts
+            base_backoff, max_backoff: Jittered exponential backoff bounds in
+                seconds, used when no Retry-After is given
+        """
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.waiting = {READ: 0, WRITE: 0}
+        self.condition = threading.Condition()
+
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.queued_time = 0.0
+        self.first_request: Optional[float] = None
+        self.last_request: Optional[float] = None
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, lane: str = READ) -> float:
+        """Block until a request may be sent; returns the seconds spent waiting"""
+        start = time.monotonic()
+        with self.condition:
+            self.waiting[lane] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if now < self.paused_until:
+                        self.condition.wait(self.paused_until - now)
+                    elif lane == READ and self.waiting[WRITE]:
+                        self.condition.wait(1 / self.rate)
+                    elif self.tokens >= 1:
+                        self.tokens -= 1
+                        break
+                    else:
+                        self.condition.wait((1 - self.tokens) / self.rate)
+            finally:
+                self.waiting[lane] -= 1
+                self.condition.notify_all()
+
+            waited = time.monotonic() - start
+            self.queued_time += waited
+            self.requests += 1
+            self.first_request = self.first_request or now
+            self.last_request = now
+        return waited
+
+    def _on_success(self) -> None:
+        with self.condition:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def _on_rate_limited(self, retry_after: Optional[float]) -> None:
+        with self.condition:
+            self.rate_limited += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0.0
+            if retry_after is not None:
+                # Jitter so waiting threads don't all resume at the same instant
+                resume = time.monotonic() + retry_after + random.uniform(0, 1)
+                self.paused_until = max(self.paused_until, resume)
+            self.condition.notify_all()
+        wait = f"{retry_after:g}s" if retry_after is not None else "backoff"
+        logger.warning(f"Rate limited by Spotify, retrying after {wait} at {self.rate:.1f} req/s")
+
+    def _count_retry(self) -> None:
+        with self.condition:
+            self.retries += 1
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * 2**attempt))
+
+    def _retryable(self, lane: str, status: Optional[int]) -> bool:
+        """
+        Whether a failed request may be sent again, status None meaning no response
+
+        A 429 was rejected before anything changed. A write that failed
+        with a 5xx or a dropped connection may still have been applied, and
+        sending it again could add tracks twice, so only reads retry those.
+        """
+        if status == 429:
+            return True
+        return lane == READ and (status is None or status in RETRY_STATUSES)
+
+    def call(self, lane: str, func: Callable, *args, **kwargs):
+        """Run one API call under the bucket, retrying throttled and failed requests"""
+        for attempt in range(self.max_retries + 1):
+            self.acquire(lane)
+            try:
+                result = func(*args, **kwargs)
+            except SpotifyException as e:
+                if not self._retryable(lane, e.http_status) or attempt == self.max_retries:
+                    raise
+                self._count_retry()
+                if e.http_status == 429:
+                    retry_after = _retry_after(e.headers)
+                    self._on_rate_limited(retry_after)
+                    if retry_after is None:
+                        time.sleep(self._backoff(attempt))
+                else:
+                    time.sleep(self._backoff(attempt))
+            except RETRY_ERRORS:
+                if not self._retryable(lane, None) or attempt == self.max_retries:
+                    raise
+                self._count_retry()
+                time.sleep(self._backoff(attempt))
+            else:
+                self._on_success()
+                return result
+
+    def metrics(self) -> Dict[str, float]:
+        with self.condition:
+            elapsed = (
+                self.last_request - self.first_request
+                if self.first_request is not None and self.last_request > self.first_request
+                else 0.0
+            )
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "queued_s": self.queued_time,
+                "avg_queued_ms": self.queued_time / self.requests * 1000 if self.requests else 0.0,
+                "effective_rps": self.requests / elapsed if elapsed else 0.0,
+                "rate": self.rate,
+            }
+
+    def stats(self) -> str:
+        m = self.metrics()
+        return (
+            f"Spotify requests: {m['requests']}, retries: {m['retries']} "
+            f"({m['rate_limited']} rate limited), avg queued {m['avg_queued_ms']:.1f}ms, "
+            f"effective {m['effective_rps']:.1f} requests/s"
+        )
+
+
+def _retry_after(headers) -> Optional[float]:
+    if not headers:
+        return None
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimitedSpotify:
+    def __init__(self, sp, scheduler: Optional[RequestScheduler] = None):
+        """
+        Proxy for a spotipy.Spotify client sending every call through a scheduler
+
+        Methods keep their spotipy signatures; anything that isn't a method is
+        passed through untouched.
+        """
+        self._sp = sp
+        self.scheduler = scheduler or default_scheduler()
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._sp, name)
+        if not callable(attr) or name.startswith("_"):
+            return attr
+        lane = lane_for(name)
+
+        def scheduled(*args, **kwargs):
+            return self.scheduler.call(lane, attr, *args, **kwargs)
+
+        scheduled.__name__ = name
+        return scheduled
+
+
+_default_scheduler: Optional[RequestScheduler] = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler() -> RequestScheduler:
+    """The process-wide scheduler, so every client shares one quota"""
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = RequestScheduler()
+        return _default_scheduler
+
+
+def spotify_client(
+    auth_manager, scheduler: Optional[RequestScheduler] = None
+) -> RateLimitedSpotify:
+    """
+    Create a scheduled spotipy client
+
+    spotipy's own urllib3 retries are turned off by giving it a plain
+    session, so 429s reach the scheduler with their Retry-After header
+    instead of being slept through inside the connection pool.
+    """
+    sp = spotipy.Spotify(auth_manager=auth_manager, requests_session=requests.Session())
+    return RateLimitedSpotify(sp, scheduler)
@@ -0,0 +1,307 @@
+import json
+import random
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+from spotipy.exceptions import SpotifyException
+
+from artist_cache import ARTIST_BATCH_SIZE
+from playlist_pager import PAGE_SIZE, get_all_playlist_items
+
+GENRE_PREFIXES = ["progressive", "deep", "melodic", "minimal", "dark", "uplifting", "tech", ""]
+GENRE_BASES = ["house", "techno", "trance", "breaks", "ambient", "electronica", "edm"]
+
+
+class ReplayClient:
+    def __init__(
+        self,
+        fixture: Dict,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate_limit_every: int = 0,
+        retry_after: float = 1,
+        seed: int = 0,
+    ):
+        """
+        Offline stand-in for spotipy.Spotify serving a recorded fixture
+
+        Implements the calls the spotify_tools scripts make. Every call
+        sleeps latency (+ up to jitter) seconds, and every rate_limit_every-th
+        call fails with a 429 carrying a Retry-After header, like the API
+        does once spotipy's own retries are exhausted.
+
+        Args:
+            fixture: {"user": {...}, "playlists": {id: {"name", "snapshot_id",
+                     "items"}}, "artists": {id: artist}, "related": {id: [ids]}}
+            latency: Seconds added to every call
+            jitter: Extra random seconds added to every call
+            rate_limit_every: Fail every Nth call with 429 (0 disables)
+            retry_after: Retry-After seconds reported on injected 429s
+        """
+        self.fixture = fixture
+        self.playlists = fixture["playlists"]
+        self.artist_map = fixture["artists"]
+        self.artist_pool = list(self.artist_map)
+        self.related = fixture.get("related", {})
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.rate_limited = 0
+        self.lock = threading.Lock()
+        self.tracks = {
+            item["track"]["uri"]: item["track"]
+            for playlist in self.playlists.values()
+            for item in playlist["items"]
+            if item.get("track")
+        }
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "ReplayClient":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f), **kwargs)
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def _call(self, name: str) -> None:
+        with self.lock:
+            self.calls[name] += 1
+            count = self.total_calls
+            delay = self.latency + (self.random.random() * self.jitter if self.jitter else 0)
+            limited = self.rate_limit_every and count % self.rate_limit_every == 0
+            if limited:
+                self.rate_limited += 1
+        if delay:
+            time.sleep(delay)
+        if limited:
+            raise SpotifyException(
+                429,
+                -1,
+                "API rate limit exceeded",
+                headers={"Retry-After": f"{self.retry_after:g}"},
+            )
+
+    def _playlist(self, playlist_id: str) -> Dict:
+        playlist = self.playlists.get(playlist_id)
+        if playlist is None:
+            raise SpotifyException(404, -1, f"Playlist {playlist_id} not found")
+        return playlist
+
+    def _page(self, playlist_id: str, limit: int, offset: int) -> Dict:
+        items = self._playlist(playlist_id)["items"]
+        end = offset + limit
+        return {
+            "items": items[offset:end],
+            "total": len(items),
+            "limit": limit,
+            "offset": offset,
+            "next": f"replay:{playlist_id}:{end}:{limit}" if end < len(items) else None,
+        }
+
+    # Read endpoints
+
+    def me(self) -> Dict:
+        self._call("me")
+        return self.fixture.get("user", {"id": "replay_user"})
+
+    def playlist(self, playlist_id: str, fields: Optional[str] = None, **kwargs) -> Dict:
+        self._call("playlist")
+        playlist = self._playlist(playlist_id)
+        return {
+            "id": playlist_id,
+            "name": playlist.get("name", playlist_id),
+            "description": playlist.get("description", ""),
+            "snapshot_id": playlist.get("snapshot_id", "0"),
+        }
+
+    def playlist_items(
+        self,
+        playlist_id: str,
+        fields: Optional[str] = None,
+        limit: int = 100,
+        offset: int = 0,
+        **kwargs,
+    ) -> Dict:
+        self._call("playlist_items")
+        if limit > PAGE_SIZE:
+            raise SpotifyException(400, -1, f"Invalid limit {limit}")
+        return self._page(playlist_id, limit, offset)
+
+    def next(self, result: Dict) -> Optional[Dict]:
+        if not result.get("next"):
+            return None
+        self._call("next")
+        _, playlist_id, offset, limit = result["next"].rsplit(":", 3)
+        return self._page(playlist_id, int(limit), int(offset))
+
+    def artist(self, artist_id: str) -> Dict:
+        self._call("artist")
+        artist = self.artist_map.get(artist_id)
+        if artist is None:
+            raise SpotifyException(404, -1, f"Artist {artist_id} not found")
+        return artist
+
+    def artists(self, artist_ids: List[str]) -> Dict:
+        self._call("artists")
+        if len(artist_ids) > ARTIST_BATCH_SIZE:
+            raise SpotifyException(400, -1, "Too many ids requested")
+        return {"artists": [self.artist_map.get(artist_id) for artist_id in artist_ids]}
+
+    def artist_related_artists(self, artist_id: str) -> Dict:
+        self._call("artist_related_artists")
+        related_ids = self.related.get(artist_id)
+        if related_ids is None:
+            # Deterministic stand-in when the fixture has no recorded list
+            pool = self.artist_pool
+            rng = random.Random(artist_id)
+            related_ids = [pool[rng.randrange(len(pool))] for _ in range(min(20, len(pool)))]
+        return {"artists": [self.artist_map[i] for i in related_ids if i in self.artist_map]}
+
+    # Write endpoints
+
+    def _modified(self, playlist: Dict) -> Dict:
+        playlist["snapshot_id"] = str(int(playlist.get("snapshot_id", "0")) + 1)
+        return {"snapshot_id": playlist["snapshot_id"]}
+
+    def user_playlist_create(
+        self, user: str, name: str, public: bool = True, description: str = "", **kwargs
+    ) -> Dict:
+        self._call("user_playlist_create")
+        with self.lock:
+            playlist_id = f"replay{len(self.playlists):016d}"
+            self.playlists[playlist_id] = {
+                "name": name,
+                "description": description,
+                "snapshot_id": "0",
+                "items": [],
+            }
+        return {"id": playlist_id, "name": name}
+
+    def playlist_add_items(
+        self, playlist_id: str, items: List[str], position: Optional[int] = None
+    ) -> Dict:
+        self._call("playlist_add_items")
+        if len(items) > 100:
+            raise SpotifyException(400, -1, "Too many tracks requested")
+        with self.lock:
+            playlist = self._playlist(playlist_id)
+            new_items = [{"track": self.tracks[uri]} for uri in items if uri in self.tracks]
+            if position is None:
+                playlist["items"].extend(new_items)
+            else:
+                playlist["items"][position:position] = new_items
+            return self._modified(playlist)
+
+    def playlist_remove_all_occurrences_of_items(
+        self, playlist_id: str, items: List[str], snapshot_id: Optional[str] = None
+    ) -> Dict:
+        self._call("playlist_remove_all_occurrences_of_items")
+        if len(items) > 100:
+            raise SpotifyException(400, -1, "Too many tracks requested")
+        removed = set(items)
+        with self.lock:
+            playlist = self._playlist(playlist_id)
+            playlist["items"] = [
+                item
+                for item in playlist["items"]
+                if not item.get("track") or item["track"]["uri"] not in removed
+            ]
+            return self._modified(playlist)
+
+    def current_user_unfollow_playlist(self, playlist_id: str) -> None:
+        self._call("current_user_unfollow_playlist")
+        with self.lock:
+            self._playlist(playlist_id)
+            del self.playlists[playlist_id]
+
+
+def synthetic_fixture(
+    n_tracks: int,
+    n_artists: Optional[int] = None,
+    playlist_id: str = "replay_playlist",
+    seed: int = 0,
+) -> Dict:
+    """
+    Generate a fixture with one playlist of n_tracks tracks
+
+    Artists (n_tracks / 5 by default) get one to three genres drawn from a
+    small vocabulary of prefix + base names, like real Spotify genres.
+    """
+    rng = random.Random(seed)
+    n_artists = n_artists or max(n_tracks // 5, 1)
+    vocabulary = [f"{prefix} {base}".strip() for prefix in GENRE_PREFIXES for base in GENRE_BASES]
+
+    artists = {}
+    for i in range(n_artists):
+        artist_id = f"A{i:021d}"
+        artists[artist_id] = {
+            "id": artist_id,
+            "name": f"Artist {i}",
+            "genres": rng.sample(vocabulary, rng.randint(0, 3)),
+            "popularity": rng.randint(0, 100),
+        }
+    artist_ids = list(artists)
+
+    items = []
+    for i in range(n_tracks):
+        artist = artists[artist_ids[rng.randrange(n_artists)]]
+        track_id = f"T{i:021d}"
+        items.append(
+            {
+                "track": {
+                    "id": track_id,
+                    "uri": f"spotify:track:{track_id}",
+                    "name": f"Track {i} ({rng.choice(['Original Mix', 'Extended Mix', 'Edit'])})",
+                    "popularity": rng.randint(0, 100),
+                    "artists": [{"id": artist["id"], "name": artist["name"]}],
+                    "album": {"name": f"Album {i // 10}", "release_date": "2024-01-01"},
+                }
+            }
+        )
+
+    return {
+        "user": {"id": "replay_user"},
+        "playlists": {
+            playlist_id: {"name": "Synthetic playlist", "snapshot_id": "0", "items": items}
+        },
+        "artists": artists,
+        "related": {},
+    }
+
+
+def record_fixture(sp, playlist_ids: Iterable[str], path: str) -> Dict:
+    """
+    Capture playlists and their artists from a live client into a fixture file
+
+    Related-artist lists aren't recorded; ReplayClient derives stand-ins.
+    """
+    fixture = {"user": sp.me(), "playlists": {}, "artists": {}, "related": {}}
+    artist_ids = set()
+    for playlist_id in playlist_ids:
+        info = sp.playlist(playlist_id, fields="name,description,snapshot_id")
+        items = [item for item in get_all_playlist_items(sp, playlist_id) if item.get("track")]
+        fixture["playlists"][playlist_id] = {
+            "name": info["name"],
+            "description": info.get("description", ""),
+            "snapshot_id": "0",
+            "items": items,
+        }
+        artist_ids.update(
+            artist["id"] for item in items for artist in item["track"]["artists"] if artist["id"]
+        )
+
+    artist_ids = sorted(artist_ids)
+    for i in range(0, len(artist_ids), ARTIST_BATCH_SIZE):
+        for artist in sp.artists(artist_ids[i : i + ARTIST_BATCH_SIZE])["artists"]:
+            if artist:
+                fixture["artists"][artist["id"]] = artist
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(fixture, f)
+    return fixture
@@ -0,0 +1,303 @@
+import argparse
+import logging
+import os
+import sys
+from array import array
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Shared spotify_tools modules live one directory up
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from artist_cache import ArtistCache, default_cache, fetch_artists, fetch_related_artists  # noqa: E402
+from rate_limit import default_scheduler  # noqa: E402
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_GRAPH_PATH = "genre_graph.npz"
+
+
+class GenreGraph:
+    def __init__(self):
+        """
+        Related-artists graph with artists and genres numbered by integer ID
+
+        Edges and per-artist genre lists are kept in flat typed arrays so the
+        graph of tens of thousands of artists stays small, and is turned into
+        a CSR adjacency (offsets + neighbors) on demand for traversals.
+        """
+        self.artist_ids: List[str] = []
+        self.names: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.genres: List[str] = []
+        self.genre_index: Dict[str, int] = {}
+
+        # Artist i's genres are genre_ids[genre_offsets[i]:genre_offsets[i + 1]]
+        self.genre_offsets = array("i", [0])
+        self.genre_ids = array("i")
+        # BFS depth from the nearest seed, and whether related artists were fetched
+        self.depth = array("h")
+        self.expanded = bytearray()
+        self.edge_src = array("i")
+        self.edge_dst = array("i")
+        self._csr = None
+
+    def __len__(self) -> int:
+        return len(self.artist_ids)
+
+    def add_artist(self, artist: Dict, depth: int) -> int:
+        """Return the artist's node ID, adding it if unseen"""
+        node = self.index.get(artist["id"])
+        if node is not None:
+            if depth < self.depth[node]:
+                self.depth[node] = depth
+            return node
+        node = len(self.artist_ids)
+        self.index[artist["id"]] = node
+        self.artist_ids.append(artist["id"])
+        self.names.append(artist.get("name", ""))
+        for genre in artist.get("genres", []):
+            genre_id = self.genre_index.get(genre)
+            if genre_id is None:
+                genre_id = self.genre_index[genre] = len(self.genres)
+                self.genres.append(genre)
+            self.genre_ids.append(genre_id)
+        self.genre_offsets.append(len(self.genre_ids))
+        self.depth.append(depth)
+        self.expanded.append(0)
+        return node
+
+    def add_related(
+        self, node: int, related: Iterable[Dict], max_artists: Optional[int] = None
+    ) -> None:
+        """Mark node expanded, not growing the graph past max_artists nodes"""
+        depth = self.depth[node] + 1
+        for artist in related:
+            if (
+                max_artists is not None
+                and len(self) >= max_artists
+                and artist["id"] not in self.index
+            ):
+                continue
+            self.edge_src.append(node)
+            self.edge_dst.append(self.add_artist(artist, depth))
+        self.expanded[node] = 1
+        self._csr = None
+
+    def artist_genres(self, node: int) -> List[str]:
+        start, end = self.genre_offsets[node], self.genre_offsets[node + 1]
+        return [self.genres[genre_id] for genre_id in self.genre_ids[start:end]]
+
+    def frontier(self, max_depth: int) -> List[int]:
+        """Unexpanded nodes shallower than max_depth, shallowest first"""
+        nodes = [
+            node
+            for node in range(len(self))
+            if not self.expanded[node] and self.depth[node] < max_depth
+        ]
+        return sorted(nodes, key=lambda node: self.depth[node])
+
+    def adjacency(self):
+        """CSR adjacency as (offsets, neighbors) numpy arrays"""
+        if self._csr is None:
+            src = np.frombuffer(self.edge_src, dtype=np.int32)
+            dst = np.frombuffer(self.edge_dst, dtype=np.int32)
+            order = np.argsort(src, kind="stable")
+            offsets = np.zeros(len(self) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(src, minlength=len(self)), out=offsets[1:])
+            self._csr = (offsets, dst[order])
+        return self._csr
+
+    def neighborhood(self, nodes: Iterable[int], hops: int = 1) -> np.ndarray:
+        """Nodes within hops edges of any of nodes, including them"""
+        offsets, neighbors = self.adjacency()
+        seen = np.zeros(len(self), dtype=bool)
+        current = np.fromiter(nodes, dtype=np.int64)
+        seen[current] = True
+        for _ in range(hops):
+            if not len(current):
+                break
+            reached = np.concatenate(
+                [neighbors[offsets[n] : offsets[n + 1]] for n in current.tolist()] or [[]]
+            ).astype(np.int64)
+            current = np.unique(reached[~seen[reached]])
+            seen[current] = True
+        return np.flatnonzero(seen)
+
+    def genre_neighborhood(self, genre: str, hops: int = 1, top: int = 20) -> List[tuple]:
+        """Most common genres among artists within hops of artists tagged genre"""
+        genre_id = self.genre_index.get(genre)
+        if genre_id is None:
+            return []
+        genre_ids = np.frombuffer(self.genre_ids, dtype=np.int32)
+        offsets = np.frombuffer(self.genre_offsets, dtype=np.int32)
+        owners = np.repeat(np.arange(len(self)), np.diff(offsets))
+        tagged = np.unique(owners[genre_ids == genre_id])
+
+        counts = Counter()
+        for node in self.neighborhood(tagged.tolist(), hops).tolist():
+            counts.update(genre_ids[offsets[node] : offsets[node + 1]].tolist())
+        counts.pop(genre_id, None)
+        return [(self.genres[g], count) for g, count in counts.most_common(top)]
+
+    def save(self, path: str = DEFAULT_GRAPH_PATH) -> None:
+        """Write the graph to an .npz file, replacing it atomically"""
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            artist_ids=np.array(self.artist_ids, dtype=str),
+            names=np.array(self.names, dtype=str),
+            genres=np.array(self.genres, dtype=str),
+            genre_offsets=np.frombuffer(self.genre_offsets, dtype=np.int32),
+            genre_ids=np.frombuffer(self.genre_ids, dtype=np.int32),
+            depth=np.frombuffer(self.depth, dtype=np.int16),
+            expanded=np.frombuffer(bytes(self.expanded), dtype=np.uint8),
+            edge_src=np.frombuffer(self.edge_src, dtype=np.int32),
+            edge_dst=np.frombuffer(self.edge_dst, dtype=np.int32),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_GRAPH_PATH) -> "GenreGraph":
+        """Reopen a saved graph, or start an empty one if path doesn't exist"""
+        graph = cls()
+        if not os.path.exists(path):
+            return graph
+        with np.load(path, allow_pickle=False) as data:
+            graph.artist_ids = data["artist_ids"].tolist()
+            graph.names = data["names"].tolist()
+            graph.genres = data["genres"].tolist()
+            graph.genre_offsets = array("i", data["genre_offsets"].astype(np.int32).tobytes())
+            graph.genre_ids = array("i", data["genre_ids"].astype(np.int32).tobytes())
+            graph.depth = array("h", data["depth"].astype(np.int16).tobytes())
+            graph.expanded = bytearray(data["expanded"].tobytes())
+            graph.edge_src = array("i", data["edge_src"].astype(np.int32).tobytes())
+            graph.edge_dst = array("i", data["edge_dst"].astype(np.int32).tobytes())
+        graph.index = {artist_id: i for i, artist_id in enumerate(graph.artist_ids)}
+        graph.genre_index = {genre: i for i, genre in enumerate(graph.genres)}
+        return graph
+
+
+def crawl(
+    sp,
+    graph: GenreGraph,
+    seed_ids: Iterable[str],
+    max_depth: int = 2,
+    max_artists: int = 5000,
+    max_workers: int = 8,
+    cache: Optional[ArtistCache] = None,
+    save_path: Optional[str] = None,
+) -> GenreGraph:
+    """
+    Breadth-first crawl of related artists from seed artists
+
+    Artists already expanded in graph are never fetched again, so calling
+    this on a reopened graph extends it from where the last crawl stopped.
+    Related-artist lists are fetched max_workers at a time; the graph itself
+    is only modified on the calling thread.
+
+    Args:
+        seed_ids: Artist IDs to start from (depth 0)
+        max_depth: Expand artists up to this many hops from a seed
+        max_artists: Stop once the graph holds this many artists; the last
+            expanded artist may keep only the related artists already in the graph
+        save_path: If set, save the graph after every BFS level
+    """
+    cache = cache or default_cache()
+    seeds = fetch_artists(sp, seed_ids, cache)
+    for artist in seeds.values():
+        graph.add_artist(artist, 0)
+
+    def related(node: int) -> Optional[List[Dict]]:
+        try:
+            return fetch_related_artists(sp, graph.artist_ids[node], cache)
+        except Exception as e:
+            logger.error(f"Error getting related artists: {e}")
+            return None
+
+    # Nodes whose fetch failed this run, so a level can't retry them forever
+    failed = set()
+    batch_size = max_workers * 4
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while len(graph) < max_artists:
+            frontier = [node for node in graph.frontier(max_depth) if node not in failed]
+            if not frontier:
+                break
+            # One BFS level at a time so depths stay minimal
+            level = graph.depth[frontier[0]]
+            frontier = [node for node in frontier if graph.depth[node] == level]
+
+            expanded = 0
+            for i in range(0, len(frontier), batch_size):
+                if len(graph) >= max_artists:
+                    break
+                batch = frontier[i : i + batch_size]
+                for node, artists in zip(batch, executor.map(related, batch)):
+                    if len(graph) >= max_artists:
+                        break
+                    if artists is None:
+                        failed.add(node)
+                    else:
+                        graph.add_related(node, artists, max_artists)
+                        expanded += 1
+            logger.info(f"Depth {level}: expanded {expanded} artists, graph has {len(graph)}")
+            if save_path:
+                graph.save(save_path)
+
+    logger.info(cache.stats())
+    return graph
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Crawl the related-artists graph and report genre neighborhoods"
+    )
+    parser.add_argument("seeds", nargs="*", help="Spotify artist IDs to crawl from")
+    parser.add_argument(
+        "--graph",
+        default=DEFAULT_GRAPH_PATH,
+        help=f"Graph file to extend (default: {DEFAULT_GRAPH_PATH})",
+    )
+    parser.add_argument("--depth", type=int, default=2, help="Maximum hops from a seed")
+    parser.add_argument(
+        "--max-artists", type=int, default=5000, help="Stop once the graph has this many artists"
+    )
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent related-artist requests")
+    parser.add_argument("--genre", help="Print the genres most common around this genre")
+    parser.add_argument("--hops", type=int, default=1, help="Neighborhood size for --genre")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    graph = GenreGraph.load(args.graph)
+    logger.info(f"Loaded graph with {len(graph)} artists and {len(graph.edge_src)} edges")
+
+    if args.seeds or graph.frontier(args.depth):
+        from view_genre_structure import setup_spotify
+
+        crawl(
+            setup_spotify(),
+            graph,
+            args.seeds,
+            max_depth=args.depth,
+            max_artists=args.max_artists,
+            max_workers=args.workers,
+            save_path=args.graph,
+        )
+        graph.save(args.graph)
+        logger.info(default_scheduler().stats())
+
+    if args.genre:
+        print(f"\nGenres within {args.hops} hop(s) of '{args.genre}':")
+        for genre, count in graph.genre_neighborhood(args.genre, args.hops):
+            print(f"  {genre}: {count}")
+
+
+if __name__ == "__main__":
+    main()
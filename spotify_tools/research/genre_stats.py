@@ -0,0 +1,138 @@
+import csv
+import heapq
+import json
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class _TrieNode:
+    __slots__ = ("children", "count", "distinct")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        # Times a genre ending at this node was added
+        self.count = 0
+        # Distinct genres ending at or below this node
+        self.distinct = 0
+
+
+class GenreTrie:
+    def __init__(self):
+        """
+        Word-level trie of genre names
+
+        'progressive house' and 'progressive trance' share the 'progressive'
+        node, so the variations of a prefix are its subtree. Node totals are
+        kept up to date on every add, so top-k queries don't rescan genres.
+        """
+        self.root = _TrieNode()
+
+    def add(self, genre: str, count: int = 1) -> None:
+        words = genre.split()
+        if not words:
+            return
+        path = [self.root]
+        for word in words:
+            path.append(path[-1].children.setdefault(word, _TrieNode()))
+        if path[-1].count == 0:
+            for node in path:
+                node.distinct += 1
+        path[-1].count += count
+
+    def _find(self, prefix: str):
+        node = self.root
+        for word in prefix.split():
+            node = node.children.get(word)
+            if node is None:
+                return None
+        return node
+
+    def variations(self, prefix: str) -> List[Tuple[str, int]]:
+        """Genres starting with prefix's words (excluding prefix itself), with counts"""
+        node = self._find(prefix)
+        if node is None:
+            return []
+        found = []
+        stack = [(prefix, node)]
+        while stack:
+            name, current = stack.pop()
+            if current.count and current is not node:
+                found.append((name, current.count))
+            for word, child in current.children.items():
+                stack.append((f"{name} {word}", child))
+        return sorted(found)
+
+    def top_prefixes(self, k: int = 10, min_variations: int = 2) -> List[Tuple[str, int]]:
+        """First words with the most distinct multi-word genres under them"""
+        scored = (
+            (word, node.distinct - (1 if node.count else 0))
+            for word, node in self.root.children.items()
+        )
+        return heapq.nlargest(
+            k,
+            (item for item in scored if item[1] >= min_variations),
+            key=lambda item: item[1],
+        )
+
+
+class GenreStats:
+    def __init__(self):
+        """Incrementally updated word, genre and prefix statistics over artists"""
+        self.artists: Dict[str, Dict] = {}
+        self.genre_counts = Counter()
+        self.word_counts = Counter()
+        self.trie = GenreTrie()
+
+    def add_artist(self, artist: Dict) -> bool:
+        """Count an artist's genres once; returns False if already counted"""
+        if artist["id"] in self.artists:
+            return False
+        self.artists[artist["id"]] = {"name": artist["name"], "genres": artist["genres"]}
+        for genre in artist["genres"]:
+            self.genre_counts[genre] += 1
+            self.word_counts.update(genre.split())
+            self.trie.add(genre)
+        return True
+
+    def update(self, artists: Iterable[Dict]) -> int:
+        return sum(self.add_artist(artist) for artist in artists)
+
+    def top_words(self, k: int = 10) -> List[Tuple[str, int]]:
+        return self.word_counts.most_common(k)
+
+    def top_genres(self, k: int = 10) -> List[Tuple[str, int]]:
+        return self.genre_counts.most_common(k)
+
+    def patterns(self, k: Optional[int] = None) -> Dict[str, List[str]]:
+        """Prefixes with more than one variation, mapped to their genres"""
+        prefixes = self.trie.top_prefixes(k or len(self.trie.root.children))
+        return {
+            prefix: [genre for genre, _ in self.trie.variations(prefix)]
+            for prefix, _ in prefixes
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            "artists": [
+                {"id": artist_id, **artist} for artist_id, artist in self.artists.items()
+            ],
+            "genres": dict(self.genre_counts.most_common()),
+            "words": dict(self.word_counts.most_common()),
+            "patterns": self.patterns(),
+        }
+
+    def export(self, path: str) -> None:
+        """
+        Write the statistics as JSON, or as one row per genre if path ends in .csv
+
+        The CSV has columns genre, prefix (first word) and artist_count.
+        """
+        if path.lower().endswith(".csv"):
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["genre", "prefix", "artist_count"])
+                for genre, count in self.genre_counts.most_common():
+                    writer.writerow([genre, genre.split()[0] if genre.split() else "", count])
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
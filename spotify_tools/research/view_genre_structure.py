@@ -1,11 +1,19 @@
+import argparse
 import logging
 import os
-from collections import defaultdict
+import sys
+from pathlib import Path
 
-import spotipy
 from dotenv import load_dotenv
 from spotipy.oauth2 import SpotifyOAuth
 
+# Shared spotify_tools modules live one directory up
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from artist_cache import default_cache, fetch_artists, fetch_related_artists  # noqa: E402
+from genre_stats import GenreStats  # noqa: E402
+from playlist_pager import iter_playlist_pages  # noqa: E402
+from rate_limit import default_scheduler, spotify_client  # noqa: E402
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -28,8 +36,8 @@ def setup_spotify():
         )
 
     scope = "playlist-read-private"
-    return spotipy.Spotify(
-        auth_manager=SpotifyOAuth(
+    return spotify_client(
+        SpotifyOAuth(
             client_id=os.getenv("SPOTIFY_CLIENT_ID"),
             client_secret=os.getenv("SPOTIFY_CLIENT_SECRET"),
             redirect_uri=os.getenv("SPOTIFY_REDIRECT_URI"),
@@ -38,10 +46,14 @@ def setup_spotify():
     )
 
 
-def analyze_artist_genres(sp, artist_id):
+def analyze_artist_genres(sp, artist_id, cache=None):
     """Get and analyze genres for an artist"""
     try:
-        artist = sp.artist(artist_id)
+        cache = cache or default_cache()
+        artist = cache.get(artist_id)
+        if artist is None:
+            artist = sp.artist(artist_id)
+            cache.put_many([artist])
         return {
             "name": artist["name"],
             "genres": artist["genres"],
@@ -52,13 +64,15 @@ def analyze_artist_genres(sp, artist_id):
         return None
 
 
-def find_related_artists_genres(sp, artist_id):
+def find_related_artists_genres(sp, artist_id, cache=None):
     """Get genres from related artists"""
     try:
-        related = sp.artist_related_artists(artist_id)
+        cache = cache or default_cache()
+        related = fetch_related_artists(sp, artist_id, cache)
+
         genres_data = []
 
-        for artist in related["artists"]:
+        for artist in related:
             genres_data.append(
                 {
                     "artist": artist["name"],
@@ -73,63 +87,87 @@ def find_related_artists_genres(sp, artist_id):
         return []
 
 
-def analyze_genre_patterns():
-    """Analyze common genre patterns in your playlist"""
-    try:
-        sp = setup_spotify()
-        playlist_id = os.getenv("SPOTIFY_PLAYLIST_ID")
-
-        # Get all tracks from playlist
-        results = sp.playlist_items(playlist_id)
+def collect_genre_stats(sp, playlist_id, cache=None, stats=None):
+    """
+    Stream a playlist page by page into GenreStats
 
-        # Collect all unique artists and their genres
-        artists_analyzed = {}
-        genre_patterns = defaultdict(set)
-        word_frequency = defaultdict(int)
-
-        for item in results["items"]:
+    Each page's unseen first artists are resolved in one batched lookup
+    while later pages are still being fetched.
+    """
+    cache = cache or default_cache()
+    stats = stats or GenreStats()
+    tracks = 0
+    for page in iter_playlist_pages(sp, playlist_id):
+        artist_ids = []
+        for item in page:
             if not item["track"] or not item["track"]["artists"]:
                 continue
-
+            tracks += 1
             artist_id = item["track"]["artists"][0]["id"]
+            if artist_id and artist_id not in stats.artists:
+                artist_ids.append(artist_id)
+        artists = fetch_artists(sp, artist_ids, cache)
+        stats.update(artists[artist_id] for artist_id in artist_ids if artist_id in artists)
+    logger.info(f"Analyzed {tracks} tracks by {len(stats.artists)} artists")
+    return stats
 
-            if artist_id not in artists_analyzed:
-                artist_data = analyze_artist_genres(sp, artist_id)
-                if artist_data:
-                    artists_analyzed[artist_id] = artist_data
 
-                    # Analyze genre patterns
-                    for genre in artist_data["genres"]:
-                        words = genre.split()
-                        for word in words:
-                            word_frequency[word] += 1
+def analyze_genre_patterns(top=10, export_path=None, show_artists=True):
+    """Analyze common genre patterns in your playlist"""
+    try:
+        sp = setup_spotify()
+        playlist_id = os.getenv("SPOTIFY_PLAYLIST_ID")
 
-                        # Look for common prefix/suffix patterns
-                        if len(words) > 1:
-                            genre_patterns[words[0]].add(" ".join(words[1:]))
+        # Collect all unique artists and their genres
+        cache = default_cache()
+        stats = collect_genre_stats(sp, playlist_id, cache)
 
         # Print analysis
-        print("\nArtist Genre Analysis:")
-        for artist_data in artists_analyzed.values():
-            print(f"\n{artist_data['name']}:")
-            for genre in sorted(artist_data["genres"]):
-                print(f"  - {genre}")
+        if show_artists:
+            print("\nArtist Genre Analysis:")
+            for artist_data in stats.artists.values():
+                print(f"\n{artist_data['name']}:")
+                for genre in sorted(artist_data["genres"]):
+                    print(f"  - {genre}")
 
         print("\nCommon Genre Patterns:")
-        for prefix, suffixes in genre_patterns.items():
-            if len(suffixes) > 1:  # Show only when there are multiple variations
-                print(f"\n'{prefix}' variations:")
-                for suffix in sorted(suffixes):
-                    print(f"  - {prefix} {suffix}")
+        for prefix, genres in stats.patterns(top).items():
+            print(f"\n'{prefix}' variations:")
+            for genre in genres:
+                print(f"  - {genre}")
 
         print("\nMost Common Genre Words:")
-        common_words = sorted(word_frequency.items(), key=lambda x: x[1], reverse=True)
-        for word, count in common_words[:10]:
+        for word, count in stats.top_words(top):
             print(f"  {word}: {count} occurrences")
 
+        if export_path:
+            stats.export(export_path)
+            logger.info(f"Exported genre statistics to {export_path}")
+
+        logger.info(cache.stats())
+        return stats
+
     except Exception as e:
         logger.error(f"Error analyzing genres: {e}")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Analyze genre naming patterns across a playlist's artists"
+    )
+    parser.add_argument(
+        "--top", type=int, default=10, help="Number of patterns and words to show (default: 10)"
+    )
+    parser.add_argument(
+        "--export", help="Write the statistics to a .json file, or a .csv of genre counts"
+    )
+    parser.add_argument(
+        "--no-artists", action="store_true", help="Skip the per-artist genre listing"
+    )
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    analyze_genre_patterns()
+    args = parse_args()
+    analyze_genre_patterns(args.top, args.export, not args.no_artists)
+    logger.info(default_scheduler().stats())